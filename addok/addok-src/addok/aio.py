@@ -0,0 +1,231 @@
+"""Asyncio flavour of the search and reverse helpers, built on redis.asyncio.
+
+The Redis round trips owned by the helpers (tokens resolution, geohash union,
+documents fetching, reverse lookups) are awaited. Results collectors are the
+ones configured in `RESULTS_COLLECTORS`: plain functions are run in a thread,
+so they do not block the event loop, while coroutine functions are awaited.
+Result processors do no I/O, so they are run as is. A `REVERSE_HELPER` other
+than `core.Reverse` (as `geo.GeoReverse`) is run in a thread too.
+"""
+
+import asyncio
+import inspect
+import json
+import uuid
+
+from .config import config
+from .core import (
+    SEARCH_CACHE,
+    SHARED_SEARCH_CACHE,
+    Result,
+    Reverse,
+    Search,
+    SearchBatch,
+    geohash_union_key,
+    known_geohash_union,
+    remember_geohash_union,
+    reverse as sync_reverse,
+    search_cache_key,
+    search_geohash,
+    store_geohash_union,
+)
+from .db import AsyncDB
+from .ds import fetch_documents_async
+from .helpers import keys as dbkeys
+from .helpers.cache import GENERATION_KEY, generation_expired, remember_generation
+from .helpers.index import FREQUENCY_CACHE, housenumbers_pipeline, set_housenumbers
+
+
+async def refresh_generation():
+    """Ask Redis for the index generation if needed, so the sync caches
+    lookups do not have to."""
+    if generation_expired():
+        remember_generation(await AsyncDB.get(GENERATION_KEY))
+
+
+async def token_keys_frequencies(*keys):
+    """Same as `helpers.index.token_keys_frequencies`, but awaitable."""
+    frequencies = {}
+    if FREQUENCY_CACHE.enabled:
+        for key in keys:
+            frequency = FREQUENCY_CACHE.get(key)
+            if frequency is not None:
+                frequencies[key] = frequency
+    missing = [key for key in keys if key not in frequencies]
+    if missing:
+        pipe = AsyncDB.pipeline(transaction=False)
+        for key in missing:
+            pipe.zcard(key)
+        for key, frequency in zip(missing, await pipe.execute()):
+            frequencies[key] = frequency
+            if FREQUENCY_CACHE.enabled:
+                FREQUENCY_CACHE.set(key, frequency)
+    return [frequencies[key] for key in keys]
+
+
+async def compute_geohash_key(geoh, with_neighbors=True):
+    """Same as `core.compute_geohash_key`, but awaitable."""
+    key = geohash_union_key(geoh, with_neighbors)
+    value = known_geohash_union(key)
+    if value is None:
+        pipe = AsyncDB.pipeline(transaction=False)
+        store_geohash_union(pipe, key, geoh, with_neighbors)
+        total, _ = await pipe.execute()
+        value = remember_geohash_union(key, total)
+    return value
+
+
+async def load_housenumbers(docs, token=None):
+    """Same as `helpers.index.load_housenumbers`, but awaitable."""
+    pipe = AsyncDB.pipeline(transaction=False)
+    housenumbers_pipeline(pipe, docs, token)
+    set_housenumbers(docs, await pipe.execute(), token)
+
+
+class AsyncSearchBatch(SearchBatch):
+    async def resolve_async(self, queries):
+        token_keys = self.token_keys(queries)
+        frequencies = await token_keys_frequencies(*token_keys)
+        self.frequencies = dict(zip(token_keys, frequencies))
+
+    async def fetch_async(self, *ids):
+        missing = [i for i in set(ids) if i not in self._blobs]
+        if missing:
+            self._blobs.update(await fetch_documents_async(*missing))
+
+
+class AsyncSearch(Search):
+    def __init__(self, fuzzy=1, limit=10, autocomplete=True, verbose=False):
+        super().__init__(
+            fuzzy=fuzzy,
+            limit=limit,
+            autocomplete=autocomplete,
+            verbose=verbose,
+            batch=AsyncSearchBatch(),
+        )
+        # Searches of a same process run concurrently, so each one needs its
+        # own tmp keys.
+        self.pid = str(uuid.uuid4())
+
+    async def __call__(self, query, lat=None, lon=None, **filters):
+        await refresh_generation()
+        await self.batch.resolve_async([query])
+        self.prepare(query, lat=lat, lon=lon, **filters)
+        if self.lat and self.lon:
+            geoh = search_geohash(self.lat, self.lon)
+            self._geohash_key = await compute_geohash_key(geoh)
+            self.debug("Computed geohash key %s", self._geohash_key)
+        await self.collect_async()
+        if config.DOCUMENT_PROJECTION_FIELDS:
+            keys = [dbkeys.projection_key_of(key) for key in self.bucket]
+            await self.batch.fetch_async(*keys)
+            # Rendering fetches the full documents of the best results.
+            return await asyncio.to_thread(lambda: list(self.render()))
+        await self.batch.fetch_async(*self.bucket)
+        if config.SPLIT_HOUSENUMBERS and self.housenumbers:
+            # Rendering loads the housenumbers.
+            return await asyncio.to_thread(lambda: list(self.render()))
+        return list(self.render())
+
+    async def collect_async(self):
+        collectors = list(config.RESULTS_COLLECTORS)
+        while collectors:
+            if inspect.iscoroutinefunction(collectors[0]):
+                collector = collectors.pop(0)
+                self.debug("** %s **", collector.__name__.upper())
+                if await collector(self):
+                    return
+                continue
+            # Run consecutive sync collectors in a single thread hop.
+            chunk = []
+            while collectors and not inspect.iscoroutinefunction(collectors[0]):
+                chunk.append(collectors.pop(0))
+            if await asyncio.to_thread(self.run_collectors, chunk):
+                return
+
+
+class AsyncReverse(Reverse):
+    async def __call__(self, lat, lon, limit=1, **filters):
+        hashes = self.prepare(lat, lon, limit, **filters)
+        for rings in range(1, max(config.REVERSE_MAX_RINGS, 1) + 1):
+            ids = await self.fetch_async(hashes)
+            blobs = await fetch_documents_async(*ids) if ids else []
+            results = [
+                Result(config.DOCUMENT_SERIALIZER.loads(blob)) for _, blob in blobs
+            ]
+            if config.SPLIT_HOUSENUMBERS and self.check_housenumber and results:
+                await load_housenumbers([r._doc for r in results])
+            results = self.process(results)
+            if self.found(rings):
+                break
+            hashes = self.expand(hashes)
+        return results
+
+    async def fetch_async(self, hashes):
+        self.debug("Fetching %s", hashes)
+        pipe = AsyncDB.pipeline(transaction=False)
+        for h in hashes:
+            self.intersect(pipe, dbkeys.geohash_key(h))
+            self.fetched.add(h)
+        ids = set().union(*await pipe.execute()) - self.keys
+        self.keys.update(ids)
+        return ids
+
+
+async def cached_search(helper, query, lat=None, lon=None, **filters):
+    # Same as `core.cached_search`.
+    if lat is not None and lon is not None:
+        lat = round(lat, config.SEARCH_CACHE_CENTER_PRECISION)
+        lon = round(lon, config.SEARCH_CACHE_CENTER_PRECISION)
+    key = search_cache_key(
+        query, helper.fuzzy, helper.wanted, helper.autocomplete, lat, lon, filters
+    )
+    await refresh_generation()
+    if SEARCH_CACHE.enabled:
+        results = SEARCH_CACHE.get(key)
+        if results is not None:
+            return list(results)
+    results = None
+    if SHARED_SEARCH_CACHE.enabled:
+        blob = await SHARED_SEARCH_CACHE.get_async(key)
+        if blob is not None:
+            results = [Result.deserialize(state) for state in json.loads(blob)]
+    if results is None:
+        results = await helper(query, lat=lat, lon=lon, **filters)
+        if SHARED_SEARCH_CACHE.enabled:
+            blob = json.dumps([result.serialize() for result in results])
+            await SHARED_SEARCH_CACHE.set_async(key, blob)
+    if SEARCH_CACHE.enabled:
+        SEARCH_CACHE.set(key, results)
+    return list(results)
+
+
+async def search(
+    query,
+    fuzzy=1,
+    limit=10,
+    autocomplete=False,
+    lat=None,
+    lon=None,
+    verbose=False,
+    **filters
+):
+    helper = AsyncSearch(
+        fuzzy=fuzzy,
+        limit=limit,
+        verbose=verbose,
+        autocomplete=autocomplete,
+    )
+    if not verbose and (SEARCH_CACHE.enabled or SHARED_SEARCH_CACHE.enabled):
+        return await cached_search(helper, query, lat=lat, lon=lon, **filters)
+    return await helper(query, lat=lat, lon=lon, **filters)
+
+
+async def reverse(lat, lon, limit=1, verbose=False, **filters):
+    if config.REVERSE_HELPER is not Reverse:
+        # Custom helpers are sync ones, so same results as the sync reverse.
+        return await asyncio.to_thread(
+            sync_reverse, lat, lon, limit=limit, verbose=verbose, **filters
+        )
+    helper = AsyncReverse(verbose=verbose)
+    return await helper(lat, lon, limit, **filters)
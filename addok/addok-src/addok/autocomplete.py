@@ -4,7 +4,7 @@ from addok.config import config
 from addok.db import DB
 from addok.helpers import keys as dbkeys
 from addok.helpers import magenta, parallelize, white, scripts
-from addok.helpers.index import token_key_frequency
+from addok.helpers.index import token_keys_frequencies
 from addok.helpers.search import preprocess_query
 from addok.helpers.text import compute_edge_ngrams
 from addok.pairs import pair_key
@@ -19,9 +19,13 @@ def index_edge_ngrams(pipe, token):
         pipe.sadd(edge_ngram_key(ngram), token)
 
 
-def deindex_edge_ngrams(token):
-    for ngram in compute_edge_ngrams(token):
-        DB.srem(edge_ngram_key(ngram), token)
+def deindex_edge_ngrams(pipe, token):
+    """Queue the removal of `token` from its edge ngrams, if no more indexed."""
+    ngram_keys = [edge_ngram_key(ngram) for ngram in compute_edge_ngrams(token)]
+    if ngram_keys:
+        scripts.deindex_edge_ngrams(
+            keys=[dbkeys.token_key(token)] + ngram_keys, args=[token], client=pipe
+        )
 
 
 class EdgeNgramIndexer:
@@ -35,9 +39,7 @@ class EdgeNgramIndexer:
     def deindex(db, key, doc, tokens, **kwargs):
         if config.INDEX_EDGE_NGRAMS:
             for token in tokens:
-                tkey = dbkeys.token_key(token)
-                if not DB.exists(tkey):
-                    deindex_edge_ngrams(token)
+                deindex_edge_ngrams(db, token)
 
 
 def only_commons_but_geohash_try_autocomplete_collector(helper):
@@ -86,18 +88,22 @@ def autocomplete(helper, tokens, skip_commons=False, use_geohash=False):
         helper.debug("No candidates. Aborting.")
         return
     token_keys = [dbkeys.token_key(t.decode()) for t in autocomplete_tokens]
+    stats = [dbkeys.TOKENS_STATS_KEY]
     if len(tokens) == 1:
         helper.debug("Ordering candidates by max score")
-        autocomplete_tokens = scripts.order_by_max_score(keys=token_keys)
+        autocomplete_tokens = scripts.order_by_max_score(keys=token_keys, args=stats)
     else:
         helper.debug("Ordering candidates by frequency")
-        autocomplete_tokens = scripts.order_by_frequency(keys=token_keys)
+        autocomplete_tokens = scripts.order_by_frequency(keys=token_keys, args=stats)
     helper.debug(
         "Found tokens to autocomplete [%s, …]", b", ".join(autocomplete_tokens[:10])
     )
+    frequencies = {}
+    if skip_commons:
+        frequencies = dict(zip(token_keys, token_keys_frequencies(*token_keys)))
     for token in autocomplete_tokens:
         key = token.decode()
-        if skip_commons and token_key_frequency(key) > config.COMMON_THRESHOLD:
+        if skip_commons and frequencies[key] > config.COMMON_THRESHOLD:
             helper.debug("Skip common token to autocomplete %s", key)
             continue
         if not helper.bucket_overflow or helper.last_token in helper.not_found:
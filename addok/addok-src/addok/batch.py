@@ -3,10 +3,15 @@ import os.path
 import sys
 from datetime import timedelta
 
+import redis
+
+from addok.autocomplete import EdgeNgramIndexer, create_edge_ngrams
 from addok.config import config
-from addok.db import DB
-from addok.ds import DS
-from addok.helpers import iter_pipe, parallelize, yielder
+from addok.db import DB, connection_params
+from addok.ds import _DB, DS, RedisStore
+from addok.helpers import iter_pipe, keys, parallelize, yielder
+from addok.helpers.cache import bump_generation
+from addok.helpers.index import compute_tokens_stats
 
 
 def run(args):
@@ -26,10 +31,156 @@ def reset(args):
         print("Nothing has been deleted.")
 
 
+def staging_params(name):
+    params = connection_params(name)
+    params["db"] = config.REINDEX_DBS[name]
+    return params
+
+
+def reindex(args):
+    """Import the files in the REINDEX_DBS databases, then swap them with the
+    live ones, so searches are served from the old data until then."""
+    if config.DOCUMENT_STORE != RedisStore:
+        print("Documents must be stored in Redis to be reindexed.")
+        return
+    DB.connect(**staging_params("indexes"))
+    _DB.connect(**staging_params("documents"))
+    try:
+        if (DB.dbsize() or _DB.dbsize()) and not args.force:
+            print("Spare databases {} are not empty.".format(config.REINDEX_DBS))
+            print("Check REINDEX_DBS, or use --force to delete their data.")
+            return
+        DB.flushdb()
+        DS.flushdb()
+        for path in args.filepath:
+            process_file(path)
+        if EdgeNgramIndexer in config.INDEXERS:
+            create_edge_ngrams()
+        if args.stats:
+            stats()
+        built = count_documents()
+    finally:
+        DB.connect(**connection_params("indexes"))
+        _DB.connect(**connection_params("documents"))
+    live = count_documents()
+    if not built or built < live * args.min_ratio:
+        print("Only {} documents built, for {} live: not swapped.".format(built, live))
+        return
+    swap_databases()
+    bump_generation()
+    if not args.keep:
+        # Old data is now in the staging databases.
+        for name in ["indexes", "documents"]:
+            redis.Redis(**staging_params(name)).flushdb(asynchronous=True)
+    print("{} documents swapped in, for {} before.".format(built, live))
+
+
+def count_documents():
+    # Projections (see DOCUMENT_PROJECTION_FIELDS) are not counted.
+    return sum(1 for _ in _DB.scan_iter(match=keys.document_key("*"), count=1000))
+
+
+def swap_databases():
+    indexes = connection_params("indexes")
+    documents = connection_params("documents")
+    swaps = [
+        (DB, indexes["db"], config.REINDEX_DBS["indexes"]),
+        (_DB, documents["db"], config.REINDEX_DBS["documents"]),
+    ]
+    indexes.pop("db")
+    documents.pop("db")
+    if indexes == documents:
+        # Same server: swap both at once, so no worker sees a mix of them.
+        pipe = DB.pipeline(transaction=True)
+        for _, live, staging in swaps:
+            pipe.swapdb(live, staging)
+        pipe.execute()
+    else:
+        for client, live, staging in swaps:
+            client.swapdb(live, staging)
+
+
+def stats(*args):
+    DB.delete(keys.TOKENS_STATS_KEY)
+    pattern = "{}*".format(keys.TOKEN_PREFIX)
+    parallelize(
+        compute_tokens_stats,
+        DB.scan_iter(match=pattern),
+        chunk_size=10000,
+        throttle=1000,
+    )
+
+
+def compact(*args):
+    try:
+        compact = DS.compact
+    except AttributeError:
+        print("Document store cannot be compacted.")
+    else:
+        print("{} documents kept.".format(compact()))
+
+
+def reencode(*args):
+    serializer = config.DOCUMENT_SERIALIZER
+    if not hasattr(serializer, "train") or not hasattr(DS, "scan"):
+        print("Documents cannot be encoded again with this serializer or store.")
+        return
+    samples = []
+    for _, blob in DS.scan():
+        samples.append(serializer.encode(serializer.loads(blob)))
+        if len(samples) >= config.SERIALIZER_DICTIONARY_SAMPLE:
+            break
+    print("Trained dictionary {}".format(serializer.train(samples, force=True)))
+    docs = []
+    total = 0
+    for key, blob in DS.scan():
+        docs.append((key, serializer.dumps(serializer.loads(blob))))
+        if len(docs) == config.BATCH_CHUNK_SIZE:
+            DS.upsert(*docs)
+            total += len(docs)
+            docs = []
+    if docs:
+        DS.upsert(*docs)
+        total += len(docs)
+    print("{} documents encoded again.".format(total))
+
+
 def register_command(subparsers):
     parser = subparsers.add_parser("batch", help="Batch import documents")
     parser.add_argument("filepath", nargs="*", help="Path to file to process")
     parser.set_defaults(func=run)
+    parser = subparsers.add_parser(
+        "stats", help="Compute tokens statistics (to be run after import)"
+    )
+    parser.set_defaults(func=stats)
+    parser = subparsers.add_parser(
+        "compact", help="Compact documents store (to be run after import)"
+    )
+    parser.set_defaults(func=compact)
+    parser = subparsers.add_parser(
+        "reencode", help="Encode again all documents with a new dictionary"
+    )
+    parser.set_defaults(func=reencode)
+    parser = subparsers.add_parser(
+        "reindex", help="Import in spare databases, then swap them with live ones"
+    )
+    parser.add_argument("filepath", nargs="+", help="Path to file to process")
+    parser.add_argument(
+        "--min-ratio",
+        type=float,
+        default=0.9,
+        help="Do not swap if fewer documents than this ratio of the live ones",
+    )
+    parser.add_argument(
+        "--stats", help="Compute tokens statistics", action="store_true"
+    )
+    parser.add_argument(
+        "--keep", help="Keep old data in spare databases", action="store_true"
+    )
+    parser.add_argument(
+        "--force", help="Delete data found in spare databases", action="store_true"
+    )
+    parser.set_defaults(func=reindex)
     parser = subparsers.add_parser("reset", help="Delete ALL indexes and documents")
     parser.add_argument("--force", help="Do not ask for confirm", action="store_true")
     parser.set_defaults(func=reset)
@@ -0,0 +1,206 @@
+"""Offline index builder.
+
+`addok build` runs the batch processors and indexers in worker processes, as
+`addok batch` does, but writes the resulting Redis commands in Redis protocol
+files instead of sending them, so the index can be built without waiting for
+Redis, and loaded later (or elsewhere) at full speed:
+
+    addok build --output build/ data.ndjson
+    cat build/documents-*.resp | redis-cli --pipe
+    cat build/indexes-*.resp build/generation.resp | redis-cli --pipe
+
+Files are named from their content, and set members are sorted, so the same
+input gives the same files. `generation.resp` sets the index generation, so it
+must be loaded last; it also carries the serializer dictionary, and the ids
+sequence when documents got ids from the build Redis.
+"""
+
+import hashlib
+import os
+import sys
+from collections import defaultdict
+from functools import partial
+from itertools import islice
+from pathlib import Path
+
+from redis.commands import CoreCommands
+from redis.connection import Encoder
+
+from addok.autocomplete import EdgeNgramIndexer, index_edge_ngrams
+from addok.config import config
+from addok.db import DB, ID_SEQUENCE_KEY, connection_params
+from addok.ds import (
+    DS,
+    RedisStore,
+    content_digest,
+    document_blobs,
+    store_documents,
+)
+from addok.helpers import iter_pipe, keys, parallelize, scripts
+from addok.helpers.cache import GENERATION_KEY
+from addok.helpers.index import index_document, index_documents
+
+
+class RESPWriter(CoreCommands):
+    """Pipeline like object, serializing the commands in Redis protocol
+    instead of sending them.
+
+    Members added with `sadd` and `zadd` are merged by key, and written with
+    one command per key when calling `getvalue`.
+    """
+
+    def __init__(self, db=None):
+        self.encoder = Encoder("utf-8", "strict", False)
+        self.commands = []
+        self.sets = defaultdict(set)
+        self.zsets = defaultdict(dict)
+        if db is not None:
+            self.execute_command("SELECT", db)
+
+    def execute_command(self, *args, **options):
+        self.commands.append(self.pack(*args))
+
+    def pack(self, *args):
+        args = [self.encoder.encode(arg) for arg in args]
+        out = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            out.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        return b"".join(out)
+
+    def sadd(self, name, *values):
+        self.sets[name].update(values)
+
+    def zadd(self, name, mapping, **options):
+        if any(options.values()):
+            return super().zadd(name, mapping, **options)
+        self.zsets[name].update(mapping)
+
+    def sorted(self, values):
+        return sorted(values, key=self.encoder.encode)
+
+    def getvalue(self):
+        out = list(self.commands)
+        for name in self.sorted(self.sets):
+            out.append(self.pack("SADD", name, *self.sorted(self.sets[name])))
+        for name in self.sorted(self.zsets):
+            mapping = self.zsets[name]
+            args = []
+            for member in self.sorted(mapping):
+                args.extend([mapping[member], member])
+            out.append(self.pack("ZADD", name, *args))
+        return b"".join(out)
+
+
+def write(output, prefix, writer):
+    content = writer.getvalue()
+    digest = hashlib.blake2b(content, digest_size=16).hexdigest()
+    (output / "{}-{}.resp".format(prefix, digest)).write_bytes(content)
+
+
+def build_processors():
+    # Documents are stored and indexed by `build_documents`.
+    return [
+        processor
+        for processor in config.BATCH_PROCESSORS
+        if processor not in (store_documents, index_documents)
+    ]
+
+
+def prepare_serializer(path):
+    """Make the serializer dictionary current before the workers are forked,
+    so all the documents use it, whatever the chunk they are in: the one of
+    the build Redis if any, else one trained from the first documents."""
+    serializer = config.DOCUMENT_SERIALIZER
+    if not hasattr(serializer, "train"):
+        return
+    size = config.SERIALIZER_DICTIONARY_SAMPLE
+    rows = islice(config.BATCH_FILE_LOADER(path), size)
+    for doc in iter_pipe(rows, build_processors()):
+        if serializer.current:
+            return
+        if doc and doc.get("_action") != "delete":
+            serializer.sample(serializer.encode(doc))
+    if not serializer.current and serializer.samples:
+        serializer.train(serializer.samples)
+
+
+def write_generation(output):
+    writer = RESPWriter(connection_params("indexes")["db"])
+    current = getattr(config.DOCUMENT_SERIALIZER, "current", None)
+    if current:
+        dictionary = config.DOCUMENT_SERIALIZER.dictionary(current)
+        mapping = {current: dictionary, "current": current}
+        writer.hset(keys.SERIALIZER_DICTIONARIES_KEY, mapping=mapping)
+    sequence = DB.get(ID_SEQUENCE_KEY)
+    if sequence is not None:
+        writer.eval(scripts.raise_counter.script, 1, ID_SEQUENCE_KEY, sequence)
+    # Derived from the files, so it is reproducible too.
+    names = "".join(sorted(path.name for path in output.glob("*.resp")))
+    generation = hashlib.blake2b(names.encode(), digest_size=16).hexdigest()
+    writer.set(GENERATION_KEY, generation)
+    (output / "generation.resp").write_bytes(writer.getvalue())
+
+
+def build_documents(output, *rows):
+    processors = build_processors()
+    indexes = RESPWriter(connection_params("indexes")["db"])
+    documents = RESPWriter(connection_params("documents")["db"])
+    to_upsert = []
+    for doc in iter_pipe(rows, processors):
+        if not doc or doc.get("_action") == "delete":
+            continue  # Nothing to delete in a new index.
+        if config.ID_FIELD not in doc:
+            if config.INCREMENTAL_IMPORT:
+                continue  # Skipped by incremental imports too.
+            doc[config.ID_FIELD] = DB.next_id()
+        key = keys.document_key(doc[config.ID_FIELD])
+        to_upsert.extend(document_blobs(key, doc))
+        index_document(indexes, doc)
+        if config.INCREMENTAL_IMPORT:
+            _id = doc[config.ID_FIELD]
+            indexes.hset(keys.content_hash_key(_id), _id, content_digest(doc))
+    if EdgeNgramIndexer in config.INDEXERS:
+        # Same as the "ngrams" command, once per token of the chunk.
+        for key in list(indexes.zsets):
+            token = key[len(keys.TOKEN_PREFIX) :]
+            if key.startswith(keys.TOKEN_PREFIX) and not token.isdigit():
+                index_edge_ngrams(indexes, token)
+    if config.DOCUMENT_STORE == RedisStore:
+        for key, blob in to_upsert:
+            documents.set(key, blob)
+        write(output, "documents", documents)
+    elif to_upsert:
+        DS.upsert(*to_upsert)  # Not a Redis store, so write it now.
+    write(output, "indexes", indexes)
+    return rows
+
+
+def build(args):
+    config.INDEX_EDGE_NGRAMS = False  # Computed by chunk instead.
+    output = Path(args.output)
+    output.mkdir(parents=True, exist_ok=True)
+    if any(output.glob("*.resp")):
+        sys.stderr.write("Output directory {} is not empty".format(output))
+        sys.exit(1)
+    for path in args.filepath:
+        if not os.path.exists(path):
+            sys.stderr.write("File not found: {}".format(path))
+            sys.exit(1)
+        print("Build from file", path)
+        prepare_serializer(path)
+        parallelize(
+            partial(build_documents, output),
+            config.BATCH_FILE_LOADER(path),
+            chunk_size=config.BATCH_CHUNK_SIZE,
+        )
+    write_generation(output)
+    print("Built into {}".format(output))
+
+
+def register_command(subparsers):
+    parser = subparsers.add_parser(
+        "build", help="Build indexes and documents as Redis protocol files"
+    )
+    parser.add_argument("filepath", nargs="+", help="Path to file to process")
+    parser.add_argument("--output", required=True, help="Directory to write to")
+    parser.set_defaults(func=build)
@@ -22,6 +22,7 @@ class Config(dict):
             "addok.shell",
             "addok.http.base",
             "addok.batch",
+            "addok.build",
             "addok.pairs",
             "addok.fuzzy",
             "addok.autocomplete",
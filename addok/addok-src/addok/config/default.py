@@ -12,6 +12,9 @@ REDIS = {
         "db": os.environ.get("REDIS_DB_DOCUMENTS") or 1,
     },
 }
+# Spare databases where "addok reindex" builds the new indexes and documents,
+# before swapping them with the live ones.
+REINDEX_DBS = {"indexes": 2, "documents": 3}
 
 # Min/max number of results to be retrieved from db and scored.
 BUCKET_MIN = 10
@@ -62,6 +65,12 @@ BATCH_PROCESSORS_PYPATHS = [
     "addok.helpers.index.index_documents",
 ]
 BATCH_FILE_LOADER_PYPATH = "addok.helpers.load_file"
+# Store housenumbers in a Redis hash per document, instead of inside it, so
+# only the queried ones are loaded (changing it needs a reimport).
+SPLIT_HOUSENUMBERS = False
+# Keep a digest of each imported document, so a document imported again
+# unchanged is skipped, and a changed one is updated.
+INCREMENTAL_IMPORT = False
 BATCH_CHUNK_SIZE = 1000
 # During imports, workers are consuming RAM;
 # let one process free for Redis by default.
@@ -90,6 +99,17 @@ SEARCH_RESULT_PROCESSORS_PYPATHS = [
     "addok.helpers.results.score_by_geo_distance",
     "addok.helpers.results.adjust_scores",
 ]
+# Only run the costly scoring processors for the results that can still
+# enter the top ones (see `addok.helpers.results.bounded`).
+SEARCH_LAZY_SCORING = False
+# Reverse looks for results in rings of geohash cells around the center one,
+# until the `limit` closest are known; this is the max number of rings.
+REVERSE_MAX_RINGS = 5
+# Use "addok.geo.GeoReverse" for k nearest neighbours search in a Redis GEO
+# index (needs "addok.geo.GeoIndexer" in INDEXERS_PYPATHS); its first search
+# radius in km (multiplied by 4 up to REVERSE_MAX_RINGS times).
+REVERSE_HELPER_PYPATH = "addok.core.Reverse"
+REVERSE_GEO_RADIUS = 0.2
 REVERSE_RESULT_PROCESSORS_PYPATHS = [
     "addok.helpers.results.load_closer",
     "addok.helpers.results.make_labels",
@@ -110,8 +130,46 @@ INDEXERS_PYPATHS = [
 ]
 # Any object like instance having `loads` and `dumps` methods.
 DOCUMENT_SERIALIZER_PYPATH = "addok.helpers.serializers.ZlibSerializer"
+# Number of documents sampled, and max size in bytes of the dictionary trained
+# by "addok.helpers.serializers.DictZlibSerializer".
+SERIALIZER_DICTIONARY_SAMPLE = 1000
+SERIALIZER_DICTIONARY_SIZE = 32768
 
 DOCUMENT_STORE_PYPATH = "addok.ds.RedisStore"
+# Fields stored apart in a small projection of each document, for scoring
+# search candidates: full documents are then only fetched for the returned
+# results (empty to disable; changing it needs a reimport).
+DOCUMENT_PROJECTION_FIELDS = []
+# Path prefix of the files of "addok.mmapstore.MMapStore".
+MMAP_STORE_PATH = "addok-documents"
+# Database of "addok.ds.SQLiteStore", and its memory mapped size in bytes.
+SQLITE_DB_PATH = "addok.db"
+SQLITE_MMAP_SIZE = 256 * 1024 * 1024
+
+# Each import bumps an index generation, used to invalidate caches; workers
+# check it at most every INDEX_GENERATION_TTL seconds.
+INDEX_GENERATION_TTL = 1
+
+# Search results cache: number of entries kept by each worker (0 to disable)
+# and lifetime in seconds of the shared Redis tier (0 to disable).
+SEARCH_CACHE_SIZE = 0
+SEARCH_CACHE_TTL = 0
+# When cache is on, search center is rounded to this number of decimals.
+SEARCH_CACHE_CENTER_PRECISION = 3
+
+# Number of token frequencies kept by each worker (0 to disable).
+TOKEN_FREQUENCY_CACHE_SIZE = 10000
+
+# Unions of geohash cells used for center-biased searches: lifetime in seconds
+# in Redis, and number of them remembered by each worker (0 to disable).
+GEOHASH_UNION_TTL = 600
+GEOHASH_UNION_CACHE_SIZE = 10000
+# Geohash precision of these unions, if lower than GEOHASH_PRECISION.
+SEARCH_GEOHASH_PRECISION = None
+
+# Number of documents whose GeoJSON feature is kept serialized by each worker,
+# when using "addok.helpers.formatters.geojson_fragment" (0 to disable).
+GEOJSON_FRAGMENT_CACHE_SIZE = 10000
 
 # Fields to be indexed
 # If you want a housenumbers field but need to name it differently, just add
@@ -1,3 +1,5 @@
+import heapq
+import json
 import uuid
 import time
 
@@ -5,31 +7,98 @@ import geohash
 
 from .config import config
 from .db import DB
-from .ds import get_document, get_documents
-from .helpers import keys as dbkeys, scripts
-from .helpers.text import ascii
+from .ds import DS, get_document, get_documents, get_projections
+from .helpers import distance_to_bbox_edge, keys as dbkeys, scripts
+from .helpers.cache import LRUCache, RedisCache, index_generation
+from .helpers.index import load_housenumbers, token_keys_frequencies
+from .helpers.results import queried_housenumber
+from .helpers.search import preprocess_query
+from .helpers.text import EntityTooLarge, ascii
 
 REDIS_UNIQUE_ID = str(uuid.uuid4())  # Really unique id for tmp values in redis.
 
 
+GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+# Unions built (or found empty) by this worker: key => (key or False, deadline).
+GEOHASH_UNIONS = LRUCache("geohash_union", "GEOHASH_UNION_CACHE_SIZE")
+
+
+def geohash_cells(geoh, with_neighbors=True):
+    """Return the keys of `geoh` cell (and its neighbors), a cell bigger than
+    the indexed ones being made of its children."""
+    cells = geohash.expand(geoh) if with_neighbors else [geoh]
+    for _ in range(config.GEOHASH_PRECISION - len(geoh)):
+        cells = [cell + char for cell in cells for char in GEOHASH_BASE32]
+    return [dbkeys.geohash_key(cell) for cell in cells]
+
+
+def geohash_union_key(geoh, with_neighbors=True):
+    # Unions of a previous index generation are never read again.
+    generation = (index_generation() or b"0").decode()
+    return "gx|{}|{}{}".format(generation, geoh, "" if with_neighbors else "|0")
+
+
+def known_geohash_union(key):
+    """Return the union `key` (or False if empty) if this worker built it
+    recently enough, None otherwise."""
+    if not GEOHASH_UNIONS.enabled:
+        return None
+    known = GEOHASH_UNIONS.get(key)
+    if known is None or known[1] <= time.monotonic():
+        return None
+    return known[0]
+
+
+def store_geohash_union(pipe, key, geoh, with_neighbors=True):
+    pipe.sunionstore(key, geohash_cells(geoh, with_neighbors))
+    # Redis does not create the key when the union is empty.
+    pipe.expire(key, config.GEOHASH_UNION_TTL)
+
+
+def remember_geohash_union(key, total):
+    value = key if total else False
+    if GEOHASH_UNIONS.enabled:
+        # Keep a margin, so a key is never used right when it expires.
+        deadline = time.monotonic() + config.GEOHASH_UNION_TTL - 1
+        GEOHASH_UNIONS.set(key, (value, deadline))
+    return value
+
+
 def compute_geohash_key(geoh, with_neighbors=True):
-    if with_neighbors:
-        neighbors = geohash.expand(geoh)
-        neighbors = [dbkeys.geohash_key(n) for n in neighbors]
-    else:
-        neighbors = [geoh]
-    key = "gx|{}".format(geoh)
-    total = DB.sunionstore(key, neighbors)
-    if not total:
-        # No need to keep it.
-        DB.delete(key)
-        key = False
-    else:
-        DB.expire(key, 10)
-    return key
+    """Return the key of the union of `geoh` cell and its neighbors, or False
+    if it is empty. Unions are stored for the current index generation, so
+    each worker only writes them once every GEOHASH_UNION_TTL seconds."""
+    key = geohash_union_key(geoh, with_neighbors)
+    value = known_geohash_union(key)
+    if value is None:
+        pipe = DB.pipeline(transaction=False)
+        store_geohash_union(pipe, key, geoh, with_neighbors)
+        value = remember_geohash_union(key, pipe.execute()[0])
+    return value
+
+
+def search_geohash(lat, lon):
+    """Return the geohash of the union used to favour results around a
+    search center."""
+    precision = config.SEARCH_GEOHASH_PRECISION or config.GEOHASH_PRECISION
+    return geohash.encode(lat, lon, min(precision, config.GEOHASH_PRECISION))
+
+
+def intersect(keys, limit, pid):
+    if len(keys) == 1:
+        key = keys[0]
+        if key.startswith(dbkeys.TOKEN_PREFIX):
+            return DB.zrevrange(key, 0, limit - 1)
+        return DB.smembers(key)
+    return scripts.zinter(keys=set(keys), args=[pid, limit])
 
 
 class Result:
+    # Attributes set by processors and formatters on most results have their
+    # slot; an instance dict is only created if others are set.
+    __slots__ = ("_doc", "_scores", "_score", "labels", "housenumber", "distance")
+    __slots__ += ("__dict__",)
+
     def __init__(self, _id):
         self.housenumber = None
         self._scores = {}
@@ -37,7 +106,6 @@ class Result:
         self.labels = []
 
     def load(self, doc_or_id):
-        self._cache = {}
         if isinstance(doc_or_id, dict):
             doc = doc_or_id
         else:
@@ -47,15 +115,19 @@ class Result:
         self._doc = doc
 
     def __getattr__(self, key):
-        if key == "_id":
+        # Only called when normal lookup fails: read the value from the
+        # document, whose updates go through `update`.
+        if key == "_doc" or key == "_id":
+            if key == "_doc":  # Not loaded yet.
+                raise AttributeError(key)
             # result._id should load the id whatever the real field used.
             key = config.ID_FIELD
-        if key not in self._cache:
-            # By convention, in case of multiple values, first value is default
-            # value, others are aliases.
-            value = self._rawattr(key)[0]
-            self._cache[key] = value
-        return self._cache[key]
+        # By convention, in case of multiple values, first value is default
+        # value, others are aliases.
+        value = self._doc.get(key, "")
+        if value.__class__ in (list, tuple):
+            return value[0]
+        return value
 
     def __str__(self):
         return (
@@ -77,9 +149,26 @@ class Result:
         # housenumbers are too verbose for a given street.
         yield from (key for key in keys if key != "housenumbers")
 
+    def items(self):
+        """Yield the `keys` with their value, as `getattr` would return it."""
+        computed = self.__dict__
+        yield "housenumber", self.housenumber
+        for key, value in self._doc.items():
+            if key == "housenumbers":
+                continue
+            if key in computed:
+                value = computed[key]
+            elif hasattr(Result, key):
+                value = getattr(self, key)
+            elif value.__class__ in (list, tuple):
+                value = value[0]
+            yield key, value
+
     def update(self, data):
         self._doc.update(data)
-        self._cache.update(data)
+        for key in data:
+            if key in Result.__slots__ and key != "housenumber":
+                setattr(self, key, data[key])
 
     def format(self):
         result = self
@@ -111,6 +200,25 @@ class Result:
         """Return a result from it's document _id."""
         return Result(dbkeys.document_key(_id))
 
+    def serialize(self):
+        """Return the computed state of the result, eg. for caching."""
+        state = dict(self.__dict__)
+        for key in Result.__slots__[:-1]:
+            try:
+                state[key] = object.__getattribute__(self, key)
+            except AttributeError:
+                pass  # Not set, so read from the document.
+        # Labels may have been ascii folded while scoring.
+        state["labels"] = [str(label) for label in self.labels]
+        return state
+
+    @classmethod
+    def deserialize(cls, state):
+        result = cls.__new__(cls)
+        for key, value in state.items():
+            setattr(result, key, value)
+        return result
+
 
 class BaseHelper:
     def __init__(self, verbose):
@@ -133,14 +241,22 @@ class Search(BaseHelper):
 
     MAX_MEANINGFUL = 10
 
-    def __init__(self, fuzzy=1, limit=10, autocomplete=True, verbose=False):
+    def __init__(
+        self, fuzzy=1, limit=10, autocomplete=True, verbose=False, batch=None
+    ):
         super().__init__(verbose=verbose)
         self.fuzzy = fuzzy
         self.wanted = limit
         self.autocomplete = autocomplete
         self.pid = REDIS_UNIQUE_ID
+        self.batch = batch
 
     def __call__(self, query, lat=None, lon=None, **filters):
+        self.prepare(query, lat=lat, lon=lon, **filters)
+        self.collect()
+        return list(self.render())
+
+    def prepare(self, query, lat=None, lon=None, **filters):
         self.lat = lat
         self.lon = lon
         self._geohash_key = None
@@ -165,33 +281,57 @@ class Search(BaseHelper):
         self.debug("Housenumbers token: %s", self.housenumbers)
         self.debug("Not found tokens: %s", self.not_found)
         self.debug("Filters: %s", ["{}={}".format(k, v) for k, v in filters.items()])
-        for collector in config.RESULTS_COLLECTORS:
+
+    def collect(self):
+        self.run_collectors(config.RESULTS_COLLECTORS)
+
+    def run_collectors(self, collectors):
+        """Run collectors until one returns a truthy value, and return it."""
+        for collector in collectors:
             self.debug("** %s **", collector.__name__.upper())
             if collector(self):
-                break
-        return list(self.render())
+                return True
+        return False
 
     @property
     def geohash_key(self):
         if self.lat and self.lon and self._geohash_key is None:
-            geoh = geohash.encode(self.lat, self.lon, config.GEOHASH_PRECISION)
-            self._geohash_key = compute_geohash_key(geoh)
+            self._geohash_key = compute_geohash_key(search_geohash(self.lat, self.lon))
             if self._geohash_key:
                 self.debug("Computed geohash key %s", self._geohash_key)
             else:
-                self.debug("Empty geohash key, deleting %s", self._geohash_key)
+                self.debug("Empty geohash key")
         return self._geohash_key
 
     def render(self):
-        self.convert()
-        self._sorted_bucket = list(self.results.values())
-        self._sorted_bucket.sort(key=lambda r: r.score, reverse=True)
-        for result in self._sorted_bucket[: self.wanted]:
+        self.convert(lazy=config.SEARCH_LAZY_SCORING)
+        # Same as a full stable sort, then slicing.
+        self._sorted_bucket = heapq.nlargest(
+            self.wanted, self.results.values(), key=lambda r: r.score
+        )
+        if config.DOCUMENT_PROJECTION_FIELDS:
+            self.complete(self._sorted_bucket)
+        for result in self._sorted_bucket:
             if result.score < config.MIN_SCORE:
                 self.debug("Score too low (%s), removing `%s`", result.score, result)
                 continue
             yield result
 
+    def complete(self, results):
+        """Replace the projections of `results` by their full documents, with
+        the values set by the processors."""
+        keys = [dbkeys.document_key(result._id) for result in results]
+        if self.batch is not None:
+            documents = dict(self.batch.get_documents(*keys))
+        else:
+            documents = dict(get_documents(*keys))
+        for key, result in zip(keys, results):
+            doc = documents.get(key)
+            if doc is not None:
+                doc.update(result._doc)
+                result._doc = doc
+        self.debug("Done getting full documents")
+
     def intersect(self, keys, limit=0):
         if not limit > 0:
             limit = max(self.wanted, config.BUCKET_MAX)
@@ -199,14 +339,10 @@ class Search(BaseHelper):
         if keys:
             if self.filters:
                 keys.extend(self.filters)
-            if len(keys) == 1:
-                key = keys[0]
-                if key.startswith(dbkeys.TOKEN_PREFIX):
-                    ids = DB.zrevrange(key, 0, limit - 1)
-                else:
-                    ids = DB.smembers(key)
+            if self.batch is not None:
+                ids = self.batch.intersect(keys, limit)
             else:
-                ids = scripts.zinter(keys=set(keys), args=[self.pid, limit])
+                ids = intersect(keys, limit, self.pid)
         return set(ids)
 
     def add_to_bucket(self, keys, limit=None):
@@ -222,22 +358,91 @@ class Search(BaseHelper):
         self.bucket = self.intersect(keys, limit)
         self.debug("%s ids in bucket so far", len(self.bucket))
 
-    def convert(self):
+    def convert(self, lazy=False):
         self.debug("Computing results")
         ids = [i for i in self.bucket if i not in self.results]
         if ids:
-            documents = get_documents(*ids)
+            # Only score from projections, if any: see `complete`.
+            projection = bool(config.DOCUMENT_PROJECTION_FIELDS)
+            if self.batch is not None:
+                documents = self.batch.get_documents(*ids, projection=projection)
+            elif projection:
+                documents = get_projections(*ids)
+            else:
+                documents = get_documents(*ids)
             self.debug("Done getting results data")
-            for _id, doc in documents:
-                result = Result(doc)
-                for processor in config.SEARCH_RESULT_PROCESSORS:
-                    valid = processor(self, result)
-                    if valid is False:
-                        break
-                else:
-                    self.results[_id] = result
+            results = ((_id, Result(doc)) for _id, doc in documents)
+            if config.SPLIT_HOUSENUMBERS and self.housenumbers:
+                results = list(results)
+                self.load_housenumbers([r for _, r in results])
+            if lazy:
+                self.score_top_results(results)
+            else:
+                for _id, result in results:
+                    if self.process_result(result, config.SEARCH_RESULT_PROCESSORS):
+                        self.results[_id] = result
         self.debug("Done computing results")
 
+    def load_housenumbers(self, results):
+        """Load the queried housenumber of `results`, if they have it."""
+        token = queried_housenumber(self)
+        load_housenumbers((r._doc for r in results), token)
+        self.debug("Done loading housenumber %s", token)
+
+    def process_result(self, result, processors):
+        for processor in processors:
+            valid = processor(self, result)
+            if valid is False:
+                return False
+        return True
+
+    def score_top_results(self, results):
+        """Only keep the results that can enter the `wanted` best ones, running
+        the costly processors (see `helpers.results.bounded`) only for them.
+
+        Other processors are first run with the costly ones replaced by their
+        best possible score, which gives an upper bound of the final score;
+        then results are fully scored by decreasing bound, until the bound
+        goes under the worst score of the top ones. Processors coming after
+        the first costly one are thus run twice for those results.
+        """
+        processors = config.SEARCH_RESULT_PROCESSORS
+        first = next(
+            (i for i, p in enumerate(processors) if hasattr(p, "bound")), None
+        )
+        if first is None:
+            first = len(processors)
+        optimistic = [optimistic_processor(p) for p in processors[first:]]
+        candidates = []
+        for position, (_id, result) in enumerate(results):
+            if not self.process_result(result, processors[:first]):
+                continue
+            scores = dict(result._scores)
+            if not self.process_result(result, optimistic):
+                continue
+            candidates.append((-result.score, position, _id, result, scores))
+        candidates.sort(key=lambda c: c[:2])
+        # Min heap of the best scores so far.
+        top = heapq.nlargest(self.wanted, (r.score for r in self.results.values()))
+        heapq.heapify(top)
+        scored = []
+        for index, (bound, position, _id, result, scores) in enumerate(candidates):
+            if len(top) >= self.wanted and -bound < top[0]:
+                self.debug("Skipping %s results", len(candidates) - index)
+                break
+            result._scores = scores
+            if not self.process_result(result, processors[first:]):
+                continue
+            if len(top) < self.wanted:
+                heapq.heappush(top, result.score)
+            else:
+                heapq.heappushpop(top, result.score)
+            scored.append((position, _id, result))
+        # Keep the bucket order, so ties are sorted the same as when scoring
+        # all results.
+        for _, _id, result in sorted(scored, key=lambda s: s[0]):
+            self.results[_id] = result
+
     @property
     def bucket_full(self):
         l = len(self.bucket)
@@ -285,51 +490,146 @@ class Search(BaseHelper):
         return self.tokens and len(self.tokens) == len(self.common)
 
 
+def optimistic_processor(processor):
+    """Return a processor adding the best score `processor` could add."""
+    bound = getattr(processor, "bound", None)
+    if bound is None:
+        return processor
+    name, ceiling = bound
+
+    def optimistic(helper, result):
+        result.add_score(name, ceiling, ceiling)
+
+    return optimistic
+
+
+class SearchBatch:
+    """Redis work shared by the searches of a `search_many` call."""
+
+    def __init__(self):
+        self.frequencies = {}
+        self._intersections = {}
+        self._blobs = {}
+
+    @staticmethod
+    def token_keys(queries):
+        token_keys = set()
+        for query in queries:
+            try:
+                tokens = preprocess_query(ascii(query.strip()))
+            except EntityTooLarge:
+                continue  # Will raise again when running this search.
+            token_keys.update(token.key for token in tokens)
+        return list(token_keys)
+
+    def resolve(self, queries):
+        """Resolve the tokens of all queries in a single round trip."""
+        token_keys = self.token_keys(queries)
+        self.frequencies = dict(zip(token_keys, token_keys_frequencies(*token_keys)))
+
+    def intersect(self, keys, limit):
+        signature = (keys[0] if len(keys) == 1 else frozenset(keys), limit)
+        if signature not in self._intersections:
+            self._intersections[signature] = intersect(keys, limit, REDIS_UNIQUE_ID)
+        return self._intersections[signature]
+
+    def fetch(self, *ids):
+        missing = [i for i in set(ids) if i not in self._blobs]
+        if missing:
+            self._blobs.update(DS.fetch(*missing))
+
+    def get_documents(self, *ids, projection=False):
+        keys = [dbkeys.projection_key_of(i) for i in ids] if projection else ids
+        self.fetch(*keys)
+        # Documents are altered while processing results, so each search
+        # needs its own copy.
+        for _id, key in zip(ids, keys):
+            if key in self._blobs:
+                yield _id, config.DOCUMENT_SERIALIZER.loads(self._blobs[key])
+
+
 class Reverse(BaseHelper):
     def __call__(self, lat, lon, limit=1, **filters):
+        hashes = self.prepare(lat, lon, limit, **filters)
+        for rings in range(1, max(config.REVERSE_MAX_RINGS, 1) + 1):
+            results = self.convert(self.fetch(hashes))
+            if self.found(rings):
+                break
+            hashes = self.expand(hashes)
+        return results
+
+    def prepare(self, lat, lon, limit=1, **filters):
+        """Init the helper state, and return the geohashes to fetch first."""
         self.lat = lat
         self.lon = lon
         self.keys = set([])
         self.results = []
         self.wanted = limit
-        self.fetched = []
+        self.fetched = set([])
         self.check_housenumber = filters.get("type") in [None, "housenumber"]
         self.only_housenumber = filters.get("type") == "housenumber"
         self.filters = [dbkeys.filter_key(k, v) for k, v in filters.items()]
-        geoh = geohash.encode(lat, lon, config.GEOHASH_PRECISION)
-        hashes = self.expand([geoh])
-        self.fetch(hashes)
-        if not self.keys:
-            hashes = self.expand(hashes)
-            self.fetch(hashes)
-        return self.convert()
+        self.geohash = geohash.encode(lat, lon, config.GEOHASH_PRECISION)
+        return self.expand([self.geohash])
 
     def expand(self, hashes):
+        """Return the neighbors of `hashes` not fetched yet: given a ring of
+        cells around the center one, this is the next ring."""
         new = []
+        seen = set(self.fetched)
         for h in hashes:
-            neighbors = geohash.expand(h)
-            for n in neighbors:
-                if n not in self.fetched:
+            for n in geohash.expand(h):
+                if n not in seen:
+                    seen.add(n)
                     new.append(n)
         return new
 
     def fetch(self, hashes):
+        """Fetch all `hashes` in one round trip, and return the new ids."""
         self.debug("Fetching %s", hashes)
+        pipe = DB.pipeline(transaction=False)
         for h in hashes:
-            k = dbkeys.geohash_key(h)
-            self.intersect(k)
-            self.fetched.append(h)
+            self.intersect(pipe, dbkeys.geohash_key(h))
+            self.fetched.add(h)
+        ids = set().union(*pipe.execute()) - self.keys
+        self.keys.update(ids)
+        return ids
 
-    def intersect(self, key):
+    def intersect(self, pipe, key):
         if self.filters:
-            keys = DB.sinter([key] + self.filters)
+            pipe.sinter([key] + self.filters)
         else:
-            keys = DB.smembers(key)
-        self.keys.update(keys)
-
-    def convert(self):
-        for _id in self.keys:
-            result = Result(_id)
+            pipe.smembers(key)
+
+    def found(self, rings):
+        """Tell whether the `wanted` closest results are known, once `rings`
+        rings of cells have been fetched around the center one: nothing can be
+        closer than the edge of the fetched area without being fetched."""
+        lat, lon, lat_error, lon_error = geohash.decode_exactly(self.geohash)
+        size = 2 * rings + 1
+        bbox = (
+            lat - lat_error * size,
+            lon - lon_error * size,
+            lat + lat_error * size,
+            lon + lon_error * size,
+        )
+        bound = distance_to_bbox_edge((self.lat, self.lon), bbox) * 1000
+        # Without distance (ie. custom processors), do not look further than
+        # needed for having enough results.
+        closer = [r for r in self.results if r.distance == "" or r.distance <= bound]
+        self.debug("%s results closer than %sm", len(closer), bound)
+        return len(closer) >= self.wanted
+
+    def convert(self, ids):
+        # All documents in one round trip.
+        documents = get_documents(*ids) if ids else []
+        results = [Result(doc) for _, doc in documents]
+        if config.SPLIT_HOUSENUMBERS and self.check_housenumber and results:
+            load_housenumbers(r._doc for r in results)
+        return self.process(results)
+
+    def process(self, results):
+        for result in results:
             for processor in config.REVERSE_RESULT_PROCESSORS:
                 valid = processor(self, result)
                 if valid is False:
@@ -338,8 +638,51 @@ class Reverse(BaseHelper):
             else:
                 self.results.append(result)
                 self.debug(result, result.distance, result.score)
-        self.results.sort(key=lambda r: r.score, reverse=True)
-        return self.results[: self.wanted]
+        # Same as a full stable sort, then slicing.
+        return heapq.nlargest(self.wanted, self.results, key=lambda r: r.score)
+
+
+SEARCH_CACHE = LRUCache("search", "SEARCH_CACHE_SIZE")
+SHARED_SEARCH_CACHE = RedisCache("search_shared", "SEARCH_CACHE_TTL")
+
+
+def search_cache_key(query, fuzzy, limit, autocomplete, lat, lon, filters):
+    filters = sorted((k, v.strip()) for k, v in filters.items() if v.strip())
+    center = None
+    if lat is not None and lon is not None:
+        center = [lat, lon]
+    return json.dumps(
+        [ascii(query.strip()), filters, limit, bool(autocomplete), fuzzy, center]
+    )
+
+
+def cached_search(helper, query, lat=None, lon=None, **filters):
+    if lat is not None and lon is not None:
+        # Round the center so close positions share the same cache entry; the
+        # rounded center is used to compute the results, so they do not depend
+        # on which query has populated the cache.
+        lat = round(lat, config.SEARCH_CACHE_CENTER_PRECISION)
+        lon = round(lon, config.SEARCH_CACHE_CENTER_PRECISION)
+    key = search_cache_key(
+        query, helper.fuzzy, helper.wanted, helper.autocomplete, lat, lon, filters
+    )
+    if SEARCH_CACHE.enabled:
+        results = SEARCH_CACHE.get(key)
+        if results is not None:
+            return list(results)
+    results = None
+    if SHARED_SEARCH_CACHE.enabled:
+        blob = SHARED_SEARCH_CACHE.get(key)
+        if blob is not None:
+            results = [Result.deserialize(state) for state in json.loads(blob)]
+    if results is None:
+        results = helper(query, lat=lat, lon=lon, **filters)
+        if SHARED_SEARCH_CACHE.enabled:
+            blob = json.dumps([result.serialize() for result in results])
+            SHARED_SEARCH_CACHE.set(key, blob)
+    if SEARCH_CACHE.enabled:
+        SEARCH_CACHE.set(key, results)
+    return list(results)
 
 
 def search(
@@ -358,9 +701,41 @@ def search(
         verbose=verbose,
         autocomplete=autocomplete,
     )
+    if not verbose and (SEARCH_CACHE.enabled or SHARED_SEARCH_CACHE.enabled):
+        return cached_search(helper, query, lat=lat, lon=lon, **filters)
     return helper(query, lat=lat, lon=lon, **filters)
 
 
+def search_many(queries, fuzzy=1, limit=10, autocomplete=False, **filters):
+    """Run many searches at once, returning a list of results for each query.
+
+    Each query is either a string or a dict with a "q" key and optional "lat",
+    "lon" and filters keys (overriding the common `filters`). Tokens are
+    resolved together, identical intersections are run only once and all
+    candidate documents are fetched at once, but results are the same as
+    calling `search` for each query.
+    """
+    rows = []
+    for query in queries:
+        params = dict(filters)
+        if isinstance(query, dict):
+            params.update(query)
+            query = params.pop("q")
+        rows.append((query, params))
+    batch = SearchBatch()
+    batch.resolve([query for query, _ in rows])
+    helpers = []
+    for query, params in rows:
+        helper = Search(
+            fuzzy=fuzzy, limit=limit, autocomplete=autocomplete, batch=batch
+        )
+        helper.prepare(query, **params)
+        helper.collect()
+        helpers.append(helper)
+    batch.fetch(*(_id for helper in helpers for _id in helper.bucket))
+    return [list(helper.render()) for helper in helpers]
+
+
 def reverse(lat, lon, limit=1, verbose=False, **filters):
-    helper = Reverse(verbose=verbose)
+    helper = config.REVERSE_HELPER(verbose=verbose)
     return helper(lat, lon, limit, **filters)
@@ -1,10 +1,15 @@
+import asyncio
+import weakref
+
 import redis
+import redis.asyncio
 from hashids import Hashids
 
 from addok.config import config
 
 
 hashids = Hashids()
+ID_SEQUENCE_KEY = "_id_sequence"
 
 
 class RedisProxy:
@@ -18,21 +23,58 @@ class RedisProxy:
         return getattr(self.instance, name)
 
     def next_id(self):
-        next_id = self.incr("_id_sequence")
+        next_id = self.incr(ID_SEQUENCE_KEY)
         return hashids.encode(next_id)
 
 
+class AsyncRedisProxy:
+    """Same as RedisProxy, but for redis.asyncio clients.
+
+    Asyncio connections can not be shared between event loops, so the client
+    is created lazily for each running loop.
+    """
+
+    Error = redis.RedisError
+
+    def __init__(self):
+        self.params = None
+        self._clients = weakref.WeakKeyDictionary()
+
+    def connect(self, *args, **kwargs):
+        self.params = (args, kwargs)
+        self._clients = weakref.WeakKeyDictionary()
+
+    @property
+    def instance(self):
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            args, kwargs = self.params
+            client = self._clients[loop] = redis.asyncio.Redis(*args, **kwargs)
+        return client
+
+    def __getattr__(self, name):
+        return getattr(self.instance, name)
+
+
 DB = RedisProxy()
+AsyncDB = AsyncRedisProxy()
+
+
+def connection_params(name):
+    params = config.REDIS.copy()
+    params.update(config.REDIS.get(name, {}))
+    return {
+        "host": params.get("host"),
+        "port": params.get("port"),
+        "db": params.get("db"),
+        "password": params.get("password"),
+        "unix_socket_path": params.get("unix_socket_path"),
+    }
 
 
 @config.on_load
 def connect():
-    params = config.REDIS.copy()
-    params.update(config.REDIS.get("indexes", {}))
-    DB.connect(
-        host=params.get("host"),
-        port=params.get("port"),
-        db=params.get("db"),
-        password=params.get("password"),
-        unix_socket_path=params.get("unix_socket_path"),
-    )
+    params = connection_params("indexes")
+    DB.connect(**params)
+    AsyncDB.connect(**params)
@@ -1,6 +1,18 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+
+from addok import hooks
 from addok.config import config
-from addok.db import DB, RedisProxy
+from addok.db import DB, AsyncRedisProxy, RedisProxy, connection_params
 from addok.helpers import keys
+from addok.helpers.cache import bump_generation
+
+logger = logging.getLogger(__name__)
 
 
 class RedisStore:
@@ -12,6 +24,23 @@ class RedisStore:
             if doc is not None:
                 yield key, doc
 
+    async def fetch_async(self, *keys):
+        pipe = _AsyncDB.pipeline(transaction=False)
+        for key in keys:
+            pipe.get(key)
+        docs = await pipe.execute()
+        return [(key, doc) for key, doc in zip(keys, docs) if doc is not None]
+
+    def scan(self):
+        """Yield all the (key, blob) pairs of the store."""
+        keys = []
+        for key in _DB.scan_iter(count=1000):
+            keys.append(key)
+            if len(keys) == 1000:
+                yield from self.fetch(*keys)
+                keys = []
+        yield from self.fetch(*keys)
+
     def upsert(self, *docs):
         pipe = _DB.pipeline(transaction=False)
         for key, blob in docs:
@@ -28,6 +57,95 @@ class RedisStore:
         _DB.flushdb()
 
 
+class SQLiteStore:
+    """Documents in a SQLite database, at `SQLITE_DB_PATH`.
+
+    Each process opens its own connections on first use, so gunicorn workers
+    never share the ones of the master process. The database is in WAL mode,
+    so readers are not blocked during imports.
+    """
+
+    # Fetches are run by chunks of a power of two keys (padded with the last
+    # key), so only a few statements are prepared and cached by each connection.
+    MAX_FETCH_SIZE = 512
+
+    def __init__(self, path=None):
+        self.path = path or config.SQLITE_DB_PATH
+        self._pid = None
+        self._reader = None
+        self._writer = None
+        self._lock = threading.Lock()  # Async searches fetch from threads.
+
+    def check_pid(self):
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._reader = self._writer = None
+
+    @property
+    def writer(self):
+        self.check_pid()
+        if self._writer is None:
+            conn = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS addok (key VARCHAR PRIMARY KEY, data BLOB)"
+            )
+            conn.commit()
+            self._writer = conn
+        return self._writer
+
+    @property
+    def reader(self):
+        self.check_pid()
+        if self._reader is None:
+            if not os.path.exists(self.path):
+                self.writer  # Create the database.
+            uri = "file:{}?mode=ro".format(self.path)
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            conn.execute("PRAGMA mmap_size={}".format(config.SQLITE_MMAP_SIZE))
+            self._reader = conn
+        return self._reader
+
+    def fetch(self, *keys):
+        hooks.record_sqlite_operation("fetch")
+        keys = {k.decode() if isinstance(k, bytes) else k: k for k in keys}
+        found = {}
+        with self._lock:
+            ids = list(keys)
+            for start in range(0, len(ids), self.MAX_FETCH_SIZE):
+                chunk = ids[start : start + self.MAX_FETCH_SIZE]
+                size = 1 << (len(chunk) - 1).bit_length()
+                chunk += chunk[-1:] * (size - len(chunk))
+                sql = "SELECT key, data FROM addok WHERE key IN ({})".format(
+                    ",".join("?" * size)
+                )
+                found.update(self.reader.execute(sql, chunk))
+        for key, original in keys.items():
+            if key in found:
+                yield original, found[key]
+
+    def scan(self):
+        # A cursor of its own, reading a snapshot of the database.
+        yield from self.reader.cursor().execute("SELECT key, data FROM addok")
+
+    def upsert(self, *docs):
+        hooks.record_sqlite_operation("upsert")
+        with self.writer as conn:  # One transaction per chunk of documents.
+            conn.executemany(
+                "INSERT OR REPLACE INTO addok (key, data) VALUES (?, ?)", docs
+            )
+
+    def remove(self, *keys):
+        hooks.record_sqlite_operation("remove")
+        with self.writer as conn:
+            conn.executemany("DELETE FROM addok WHERE key=?", ((k,) for k in keys))
+
+    def flushdb(self):
+        with self.writer as conn:
+            conn.execute("DELETE FROM addok")
+
+
 class DSProxy:
     instance = None
 
@@ -36,6 +154,7 @@ class DSProxy:
 
 
 _DB = RedisProxy()
+_AsyncDB = AsyncRedisProxy()
 DS = DSProxy()
 
 
@@ -44,35 +163,105 @@ def on_load():
     DS.instance = config.DOCUMENT_STORE()
     # Do not create connection if not using this store class.
     if config.DOCUMENT_STORE == RedisStore:
-        params = config.REDIS.copy()
-        params.update(config.REDIS.get("documents", {}))
-        _DB.connect(
-            host=params.get("host"),
-            port=params.get("port"),
-            db=params.get("db"),
-            password=params.get("password"),
-            unix_socket_path=params.get("unix_socket_path"),
-        )
+        params = connection_params("documents")
+        _DB.connect(**params)
+        _AsyncDB.connect(**params)
 
 
 def store_documents(docs):
     to_upsert = []
     to_remove = []
+    replaced = {}
+    digests = {}
+    if config.INCREMENTAL_IMPORT:
+        docs, digests = changed_documents(docs)
     for doc in docs:
         if not doc:
             continue
         if config.ID_FIELD not in doc:
             doc[config.ID_FIELD] = DB.next_id()
         key = keys.document_key(doc[config.ID_FIELD])
-        if doc.get("_action") in ["delete", "update"]:
+        action = doc.get("_action")
+        if key in digests and action in ["index", None]:
+            # Also when not known: it may have been imported before this mode.
+            action = "update"
+        if action in ["delete", "update"]:
             to_remove.append(key)
-        if doc.get("_action") in ["index", "update", None]:
-            to_upsert.append((key, config.DOCUMENT_SERIALIZER.dumps(doc)))
+            replaced.setdefault(key, []).append(doc)
+            if config.DOCUMENT_PROJECTION_FIELDS:
+                to_remove.append(keys.projection_key_of(key))
+        if action in ["index", "update", None]:
+            to_upsert.extend(document_blobs(key, doc))
+        if key in digests:
+            # Stored by `index_documents`, once the document is indexed.
+            doc["_hash"] = digests[key]
+            doc["_action"] = action
         yield doc
+    # Hand over the versions about to be removed, for `index_documents` to
+    # deindex them without fetching them one by one.
+    known = dict(get_documents(*replaced)) if replaced else {}
+    for key, replacing in replaced.items():
+        for doc in replacing:
+            doc["_known"] = known.get(key)
     if to_remove:
         DS.remove(*to_remove)
     if to_upsert:
         DS.upsert(*to_upsert)
+    if to_remove or to_upsert:
+        bump_generation()
+
+
+def content_digest(doc):
+    content = {k: v for k, v in doc.items() if k != "_action"}
+    content = json.dumps(content, sort_keys=True).encode()
+    return hashlib.blake2b(content, digest_size=8).digest()
+
+
+def changed_documents(docs):
+    """Drop the documents whose content did not change since they have been
+    imported (see INCREMENTAL_IMPORT). Return the kept documents, and their
+    content digest by key."""
+    docs = [doc for doc in docs if doc]
+    identified = [doc for doc in docs if config.ID_FIELD in doc]
+    if len(identified) < len(docs):
+        # They would get a new id, so be imported again, at each import.
+        skipped = len(docs) - len(identified)
+        logger.warning("Skipped %s documents without %s", skipped, config.ID_FIELD)
+    pipe = DB.pipeline(transaction=False)
+    for doc in identified:
+        _id = doc[config.ID_FIELD]
+        pipe.hget(keys.content_hash_key(_id), _id)
+    kept = []
+    digests = {}
+    for doc, stored in zip(identified, pipe.execute()):
+        if doc.get("_action") != "delete":
+            digest = content_digest(doc)
+            if stored == digest:
+                continue
+            digests[keys.document_key(doc[config.ID_FIELD])] = digest
+        kept.append(doc)
+    return kept, digests
+
+
+def document_blobs(key, doc):
+    """Return the (key, blob) pairs to store for `doc`."""
+    stored = doc
+    if config.SPLIT_HOUSENUMBERS:
+        # Indexed apart, by HousenumbersIndexer.
+        excluded = ("housenumbers", config.HOUSENUMBERS_FIELD)
+        stored = {k: v for k, v in doc.items() if k not in excluded}
+    blobs = [(key, config.DOCUMENT_SERIALIZER.dumps(stored))]
+    if config.DOCUMENT_PROJECTION_FIELDS:
+        blob = config.DOCUMENT_SERIALIZER.dumps(projection(stored))
+        blobs.append((keys.projection_key_of(key), blob))
+    return blobs
+
+
+def projection(doc):
+    """Return the fields of `doc` needed for scoring it as a search result
+    (see DOCUMENT_PROJECTION_FIELDS)."""
+    fields = [config.ID_FIELD, "housenumbers"] + config.DOCUMENT_PROJECTION_FIELDS
+    return {field: doc[field] for field in fields if field in doc}
 
 
 def get_document(key):
@@ -87,3 +276,20 @@ def get_document(key):
 def get_documents(*keys):
     for id_, blob in DS.fetch(*keys):
         yield id_, config.DOCUMENT_SERIALIZER.loads(blob)
+
+
+def get_projections(*document_keys):
+    """Same as `get_documents`, but yielding the projections of the documents
+    (see DOCUMENT_PROJECTION_FIELDS)."""
+    projection_keys = {keys.projection_key_of(key): key for key in document_keys}
+    for key, blob in DS.fetch(*projection_keys):
+        yield projection_keys[key], config.DOCUMENT_SERIALIZER.loads(blob)
+
+
+async def fetch_documents_async(*keys):
+    """Return the (key, blob) pairs of the found documents, without blocking the
+    event loop even if the document store has no `fetch_async` method."""
+    fetch = getattr(DS.instance, "fetch_async", None)
+    if fetch is None:
+        return await asyncio.to_thread(lambda: list(DS.fetch(*keys)))
+    return await fetch(*keys)
@@ -3,6 +3,7 @@ import string
 from addok.db import DB
 from addok.helpers import keys as dbkeys
 from addok.helpers import blue, white
+from addok.helpers.index import token_keys_frequencies
 from addok.helpers.search import preprocess_query
 from addok.helpers.text import Token
 from addok.pairs import pair_key
@@ -100,12 +101,10 @@ def try_fuzzy(helper, tokens, include_common=True):
             fuzzy_words.sort(key=lambda x: neighbors.index(x))
         else:
             # The token we are considering is alone.
-            fuzzy_words = []
-            for neighbor in neighbors:
-                key = dbkeys.token_key(neighbor)
-                count = DB.zcard(key)
-                if count:
-                    fuzzy_words.append(neighbor)
+            counts = token_keys_frequencies(
+                *(dbkeys.token_key(neighbor) for neighbor in neighbors)
+            )
+            fuzzy_words = [n for n, count in zip(neighbors, counts) if count]
         if fuzzy_words:
             helper.debug("Found fuzzy candidates %s", fuzzy_words)
             fuzzy_keys = [dbkeys.token_key(w) for w in fuzzy_words]
@@ -129,7 +128,8 @@ def do_fuzzyindex(self, word):
     word = list(preprocess_query(word))[0]
     token = Token(word)
     neighbors = make_fuzzy(token)
-    neighbors = [(n, DB.zcard(dbkeys.token_key(n))) for n in neighbors]
+    counts = token_keys_frequencies(*(dbkeys.token_key(n) for n in neighbors))
+    neighbors = list(zip(neighbors, counts))
     neighbors.sort(key=lambda n: n[1], reverse=True)
     for token, freq in neighbors:
         if freq == 0:
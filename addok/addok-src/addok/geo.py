@@ -0,0 +1,108 @@
+"""Redis GEO index, for true k nearest neighbours reverse geocoding.
+
+Every position (document center and housenumbers) is stored in a single GEO
+sorted set; reverse then asks Redis for the closest positions with
+`GEOSEARCH … ASC COUNT`, in a small radius expanded until enough documents
+are found, instead of loading whole geohash cells. To use it:
+
+    INDEXERS_PYPATHS = [..., "addok.geo.GeoIndexer"]
+    REVERSE_HELPER_PYPATH = "addok.geo.GeoReverse"
+
+and reindex the data. It needs Redis >= 6.2 (`GEOSEARCH`, `SMISMEMBER`).
+"""
+
+from addok.config import config
+from addok.core import Reverse
+from addok.db import DB
+from addok.helpers import keys
+
+# Redis GEO only accepts these latitudes.
+MAX_LATITUDE = 85.05112878
+
+
+def housenumber_member(key, number):
+    return "h|{}|{}".format(number, key)
+
+
+def member_document(member):
+    """Return the document key of a GEO member, and whether it is a
+    housenumber position."""
+    if member.startswith(b"h|"):
+        return member.split(b"|", 2)[2], True
+    return member, False
+
+
+def positions(key, doc):
+    yield key, doc["lat"], doc["lon"]
+    for number, data in doc.get("housenumbers", {}).items():
+        yield housenumber_member(key, number), data["lat"], data["lon"]
+
+
+class GeoIndexer:
+    @staticmethod
+    def index(pipe, key, doc, tokens, **kwargs):
+        values = []
+        for member, lat, lon in positions(key, doc):
+            if abs(float(lat)) <= MAX_LATITUDE:
+                values.extend([float(lon), float(lat), member])
+        if values:
+            pipe.geoadd(keys.GEO_KEY, values)
+
+    @staticmethod
+    def deindex(db, key, doc, tokens, **kwargs):
+        db.zrem(keys.GEO_KEY, *(member for member, _, _ in positions(key, doc)))
+
+
+class GeoReverse(Reverse):
+    """Reverse helper using the GEO index built by `GeoIndexer`."""
+
+    def __call__(self, lat, lon, limit=1, **filters):
+        self.prepare(lat, lon, limit, **filters)
+        radius = config.REVERSE_GEO_RADIUS
+        count = self.wanted * 4
+        results = []
+        for _ in range(max(config.REVERSE_MAX_RINGS, 1)):
+            members = self.search(radius, count)
+            # Already processed ids are closer ones, so their results are kept.
+            ids = [i for i in self.select(members) if i not in self.keys]
+            ids = ids[: self.wanted - len(self.results)]
+            results = self.convert(ids)
+            self.keys.update(ids)
+            if len(self.results) >= self.wanted:
+                break
+            if len(members) >= count:
+                count *= 4  # More positions are in this radius.
+            else:
+                radius *= 4
+        return results
+
+    def search(self, radius, count):
+        self.debug("Searching %s positions within %skm", count, radius)
+        return DB.geosearch(
+            keys.GEO_KEY,
+            longitude=self.lon,
+            latitude=self.lat,
+            radius=radius,
+            unit="km",
+            sort="ASC",
+            count=count,
+        )
+
+    def select(self, members):
+        """Return the documents matching the positions, closest first."""
+        ids = []
+        for member in members:
+            _id, is_housenumber = member_document(member)
+            if is_housenumber and not self.check_housenumber:
+                continue  # Results will be scored from their center.
+            if not is_housenumber and self.only_housenumber:
+                continue
+            if _id not in ids:
+                ids.append(_id)
+        if ids and self.filters:
+            pipe = DB.pipeline(transaction=False)
+            for key in self.filters:
+                pipe.smismember(key, ids)
+            matches = zip(*pipe.execute())
+            ids = [_id for _id, match in zip(ids, matches) if all(match)]
+        return ids
@@ -89,6 +89,20 @@ def haversine_distance(point1, point2):
     return km
 
 
+def distance_to_bbox_edge(point, bbox):
+    """
+    Return a lower bound of the great circle distance, in km, between a point
+    and anything outside the bbox (south, west, north, east) containing it.
+    """
+    lat, lon = point
+    south, west, north, east = bbox
+    to_parallel = radians(min(north - lat, lat - south))
+    # Meridians are the closest on the parallel the nearest to a pole.
+    widest = min(max(abs(north), abs(south)), 90)
+    to_meridian = cos(radians(widest)) * sin(radians(min(east - lon, lon - west, 90)))
+    return 6367 * max(min(to_parallel, to_meridian), 0)
+
+
 def km_to_score(km):
     # Score between 0 and 0.1 (close to 0 km will be close to 0.1, and 100 and
     # above will be 0).
@@ -0,0 +1,147 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from addok import hooks
+from addok.config import config
+from addok.db import DB, AsyncDB
+
+GENERATION_KEY = "_index_generation"
+
+_generation = {"value": None, "checked": None}
+
+
+def index_generation():
+    """Return the index generation as known by this worker.
+
+    Redis is asked again only once INDEX_GENERATION_TTL seconds have passed,
+    so a cache lookup does not cost a round trip most of the time.
+    """
+    if generation_expired():
+        remember_generation(DB.get(GENERATION_KEY))
+    return _generation["value"]
+
+
+def generation_expired():
+    checked = _generation["checked"]
+    return (
+        checked is None or time.monotonic() - checked >= config.INDEX_GENERATION_TTL
+    )
+
+
+def remember_generation(value):
+    _generation["value"] = value
+    _generation["checked"] = time.monotonic()
+
+
+def bump_generation(pipe=None):
+    """Mark the index as changed, so every cache built on it is invalidated.
+
+    A random value (and not a counter) is used, so a flushed then refilled
+    database can never come back to an already seen generation.
+    """
+    value = uuid.uuid4().hex.encode()
+    (pipe or DB).set(GENERATION_KEY, value)
+    remember_generation(value)
+    return value
+
+
+def forget_generation():
+    """Force next `index_generation` call to ask Redis."""
+    _generation["checked"] = None
+
+
+class LRUCache:
+    """Worker local LRU cache, cleared as soon as the index generation changes.
+
+    `size` is the name of the config key holding the max number of entries,
+    so it can be changed at runtime; a size of 0 disables the cache.
+    Thread safe, as async searches run their collectors in threads.
+    """
+
+    def __init__(self, name, size):
+        self.name = name  # Used as operation name when reporting hits.
+        self.size = size
+        self.generation = None
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def maxsize(self):
+        return config.get(self.size) or 0
+
+    @property
+    def enabled(self):
+        return self.maxsize > 0
+
+    def check_generation(self):
+        generation = index_generation()
+        with self._lock:
+            if generation != self.generation:
+                self._data.clear()
+                self.generation = generation
+
+    def get(self, key):
+        self.check_generation()
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                value = None
+            else:
+                self._data.move_to_end(key)
+        hooks.record_cache_operation(self.name, "miss" if value is None else "hit")
+        return value
+
+    def set(self, key, value):
+        self.check_generation()
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RedisCache:
+    """Cache shared by all workers, stored in the indexes database.
+
+    Keys embed the index generation, so stale entries are never read again
+    and just wait for their TTL to expire. `ttl` is the name of the config key
+    holding the entries lifetime in seconds; 0 disables the cache.
+    """
+
+    def __init__(self, name, ttl):
+        self.name = name
+        self.ttl = ttl
+
+    @property
+    def enabled(self):
+        return (config.get(self.ttl) or 0) > 0
+
+    def key(self, key):
+        generation = (index_generation() or b"0").decode()
+        return "c|{}|{}|{}".format(self.name, generation, key)
+
+    def get(self, key):
+        value = DB.get(self.key(key))
+        hooks.record_cache_operation(self.name, "miss" if value is None else "hit")
+        return value
+
+    def set(self, key, value):
+        DB.set(self.key(key), value, ex=config.get(self.ttl))
+
+    async def get_async(self, key):
+        value = await AsyncDB.get(self.key(key))
+        hooks.record_cache_operation(self.name, "miss" if value is None else "hit")
+        return value
+
+    async def set_async(self, key, value):
+        await AsyncDB.set(self.key(key), value, ex=config.get(self.ttl))
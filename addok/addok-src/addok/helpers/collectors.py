@@ -99,6 +99,69 @@ def ensure_geohash_results_are_included_if_center_is_given(helper):
         helper.add_to_bucket(helper.keys + [helper.geohash_key], max(helper.wanted, 10))
 
 
+def bucket_on_server(helper):
+    """Same as `bucket_with_meaningful`, `reduce_with_other_commons` and
+    `ensure_geohash_results_are_included_if_center_is_given` together, but
+    running all the intersections inside Redis in one round trip (two when
+    autocomplete is off, to check the cream in between, like the former)."""
+    if not helper.meaningful:
+        # Nothing to intersect, stick with the reference implementation.
+        reduce_with_other_commons(helper)
+        ensure_geohash_results_are_included_if_center_is_given(helper)
+        return
+    if len(helper.meaningful) == 1 and helper.common and not helper.filters:
+        # See bucket_with_meaningful.
+        for token in helper.common:
+            if token not in helper.meaningful:
+                helper.meaningful.append(token)
+                break
+    steps = "brg"
+    if helper.only_commons:
+        steps = "bg"
+    if helper.bucket_empty and not helper.autocomplete:
+        _collect_on_server(helper, "b")
+        if helper.has_cream() and helper.cream < config.BUCKET_MIN:
+            helper.debug("Cream found. Returning.")
+            return True
+        steps = steps.replace("b", "")
+    _collect_on_server(helper, steps)
+
+
+def _collect_on_server(helper, steps):
+    keys = [t.db_key for t in helper.meaningful + helper.common] + helper.filters
+    geohash_key = helper.geohash_key if "g" in steps else None
+    if geohash_key:
+        keys.append(geohash_key)
+    was_empty = helper.bucket_empty
+    helper.debug("Collecting on server (%s) with keys %s", steps, keys)
+    added, ids = scripts.collect(
+        keys=keys,
+        args=[
+            helper.pid,
+            steps,
+            config.BUCKET_MIN,
+            config.BUCKET_MAX,
+            helper.wanted,
+            len(helper.meaningful),
+            len(helper.common),
+            len(helper.filters),
+            1 if geohash_key else 0,
+            *helper.bucket,
+        ],
+    )
+    for key in added:
+        key = key.decode()
+        helper.meaningful.append(next(t for t in helper.common if t.db_key == key))
+    helper.keys = [t.db_key for t in helper.meaningful] + helper.filters
+    matched = set(t.db_key for t in helper.meaningful)
+    if was_empty:
+        helper.matched_keys = matched
+    else:
+        helper.matched_keys.update(matched)
+    helper.bucket = set(ids)
+    helper.debug("%s ids in bucket so far", len(helper.bucket))
+
+
 def extend_results_reducing_tokens(helper):
     if helper.bucket_full or helper.has_cream():
         return True
@@ -1,16 +1,32 @@
+import json
+from json.encoder import encode_basestring_ascii
+
+from addok.helpers.cache import LRUCache
+
+# Parts of the GeoJSON features only depending on their document.
+FRAGMENTS = LRUCache("geojson_fragment", "GEOJSON_FRAGMENT_CACHE_SIZE")
+
+
+class RawJSON(str):
+    """Already serialized JSON, spliced as is in the responses."""
+
+
+def document_properties(result, properties):
+    for key, val in result.items():
+        if val and key not in ["lat", "lon", "_id"]:
+            properties[key] = val
+    type_ = result._doc.get("type")
+    if type_ and type_ not in properties:
+        properties[type_] = properties.get("name")
+
+
 def geojson(result):
     properties = {
         "label": str(result),
     }
     if result._scores:
         properties["score"] = result.score
-    for key in result.keys:
-        val = getattr(result, key, None)
-        if val and key not in ["lat", "lon", "_id"]:
-            properties[key] = val
-    type_ = result._doc.get("type")
-    if type_ and type_ not in properties:
-        properties[type_] = properties.get("name")
+    document_properties(result, properties)
     housenumber = getattr(result, "housenumber", None)
     if housenumber:
         properties["name"] = "{} {}".format(housenumber, properties.get("name"))
@@ -26,3 +42,50 @@ def geojson(result):
         },
         "properties": properties,
     }
+
+
+def fragment(result):
+    """Serialize the feature of `result` without its label, score and
+    distance, as a (head, properties) pair of JSON strings."""
+    properties = {}
+    document_properties(result, properties)
+    head = json.dumps(
+        {"type": "Feature", "geometry": geojson(result)["geometry"]}
+    )[:-1]
+    body = json.dumps(properties)[1:-1]
+    return head + ', "properties": {"label": ', ", " + body if body else ""
+
+
+def geojson_fragment(result):
+    """Same as `geojson`, but already serialized: the part of the feature only
+    depending on the document is serialized once per worker, and spliced with
+    the label, score and distance of each response."""
+    # Processors matching a housenumber, or setting other values, change the
+    # feature of this query only.
+    if not FRAGMENTS.enabled or result.housenumber or result.__dict__:
+        return RawJSON(json.dumps(geojson(result)))
+    head, body = FRAGMENTS.get(result._id) or (None, None)
+    if head is None:
+        head, body = fragment(result)
+        FRAGMENTS.set(result._id, (head, body))
+    parts = [head, encode_basestring_ascii(str(result))]
+    if result._scores:
+        parts.append(', "score": ' + repr(result.score))
+    parts.append(body)
+    try:
+        parts.append(', "distance": {}'.format(int(result.distance)))
+    except ValueError:
+        pass
+    parts.append("}}")
+    return RawJSON("".join(parts))
+
+
+def dumps(content):
+    """Serialize `content`, splicing its `RawJSON` features as is."""
+    features = content.get("features")
+    if not features or not isinstance(features[0], RawJSON):
+        return json.dumps(content)
+    # Keys are unique and other strings escaped, so this is the features key.
+    return json.dumps(dict(content, features=[])).replace(
+        '"features": []', '"features": [' + ", ".join(features) + "]", 1
+    )
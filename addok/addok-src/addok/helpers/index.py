@@ -1,11 +1,14 @@
+import json
+
 import geohash
 import redis
 
 from addok.config import config
 from addok.db import DB
-from addok.ds import get_document
+from addok.ds import get_documents
 
 from . import iter_pipe, keys, yielder
+from .cache import LRUCache, bump_generation
 
 VALUE_SEPARATOR = "|~|"
 
@@ -19,14 +22,38 @@ def preprocess(s):
 _CACHE = {}
 
 
+# Frequencies only change on import, so keep the hot ones in each worker.
+FREQUENCY_CACHE = LRUCache("token_frequency", "TOKEN_FREQUENCY_CACHE_SIZE")
+
+
 def token_key_frequency(key):
-    return DB.zcard(key)
+    return token_keys_frequencies(key)[0]
 
 
 def token_frequency(token):
     return token_key_frequency(keys.token_key(token))
 
 
+def token_keys_frequencies(*keys):
+    """Return the frequency of each key, in at most one round trip."""
+    frequencies = {}
+    if FREQUENCY_CACHE.enabled:
+        for key in keys:
+            frequency = FREQUENCY_CACHE.get(key)
+            if frequency is not None:
+                frequencies[key] = frequency
+    missing = [key for key in keys if key not in frequencies]
+    if missing:
+        pipe = DB.pipeline(transaction=False)
+        for key in missing:
+            pipe.zcard(key)
+        for key, frequency in zip(missing, pipe.execute()):
+            frequencies[key] = frequency
+            if FREQUENCY_CACHE.enabled:
+                FREQUENCY_CACHE.set(key, frequency)
+    return [frequencies[key] for key in keys]
+
+
 def extract_tokens(tokens, string, boost):
     els = list(preprocess(string))
     if not els:
@@ -40,33 +67,65 @@ def extract_tokens(tokens, string, boost):
 def index_tokens(pipe, tokens, key, **kwargs):
     for token, boost in tokens.items():
         pipe.zadd(keys.token_key(token), mapping={key: boost})
+    if kwargs.get("drop_stats") and tokens:
+        drop_tokens_stats(pipe, tokens)
 
 
-def deindex_field(key, string):
+def deindex_field(pipe, key, string):
     els = list(preprocess(string))
     for s in els:
-        deindex_token(key, s)
+        deindex_token(pipe, key, s)
     return els
 
 
-def deindex_token(key, token):
+def deindex_token(pipe, key, token):
     tkey = keys.token_key(token)
-    DB.zrem(tkey, key)
+    pipe.zrem(tkey, key)
+
+
+def known_documents(docs):
+    """Return the currently stored version of `docs`, in one fetch.
+
+    `store_documents` overwrites them at the end of the chunk, so it hands
+    over the versions it replaces as `_known`; they are only fetched here if
+    it did not run before."""
+    known = {}
+    missing = []
+    for doc in docs:
+        key = keys.document_key(doc[config.ID_FIELD])
+        if "_known" in doc:
+            known[key] = doc.pop("_known")
+        else:
+            missing.append(key)
+    if missing:
+        known.update(get_documents(*missing))
+    known = [doc for doc in known.values() if doc]
+    if known and config.SPLIT_HOUSENUMBERS:
+        load_housenumbers(known)
+    return known
 
 
 def index_documents(docs):
     pipe = DB.pipeline(transaction=False)
+    # Only maintain tokens statistics once they have been built.
+    drop_stats = bool(DB.exists(keys.TOKENS_STATS_KEY))
+    chunk = []
     for doc in docs:
         if not doc:
             continue
-        if doc.get("_action") in ["delete", "update"]:
-            key = keys.document_key(doc[config.ID_FIELD]).encode()
-            known_doc = get_document(key)
-            if known_doc:
-                deindex_document(known_doc)
-        if doc.get("_action") in ["index", "update", None]:
-            index_document(pipe, doc)
+        chunk.append(doc)
         yield doc
+    # All the removals are queued before the new versions are indexed, in the
+    # same pipeline.
+    to_deindex = [d for d in chunk if d.get("_action") in ["delete", "update"]]
+    for known_doc in known_documents(to_deindex):
+        deindex_document(pipe, known_doc, drop_stats=drop_stats)
+    for doc in chunk:
+        if doc.get("_action") in ["index", "update", None]:
+            index_document(pipe, doc, drop_stats=drop_stats)
+        store_content_digest(pipe, doc)
+    if chunk:
+        bump_generation(pipe)
     try:
         pipe.execute()
     except redis.RedisError as e:
@@ -74,6 +133,16 @@ def index_documents(docs):
         raise ValueError(msg)
 
 
+def store_content_digest(pipe, doc):
+    """Remember the digest computed by `store_documents` for the imported
+    `doc` (see INCREMENTAL_IMPORT), or forget it once deleted."""
+    _id = doc[config.ID_FIELD]
+    if "_hash" in doc:
+        pipe.hset(keys.content_hash_key(_id), _id, doc.pop("_hash"))
+    elif config.INCREMENTAL_IMPORT and doc.get("_action") == "delete":
+        pipe.hdel(keys.content_hash_key(_id), _id)
+
+
 def index_document(pipe, doc, **kwargs):
     key = keys.document_key(doc[config.ID_FIELD])
     tokens = {}
@@ -85,11 +154,34 @@ def index_document(pipe, doc, **kwargs):
             return  # Do not index.
 
 
-def deindex_document(doc, **kwargs):
+def deindex_document(pipe, doc, **kwargs):
     key = keys.document_key(doc[config.ID_FIELD])
     tokens = []
     for indexer in config.INDEXERS:
-        indexer.deindex(DB, key, doc, tokens, **kwargs)
+        indexer.deindex(pipe, key, doc, tokens, **kwargs)
+    if kwargs.get("drop_stats") and tokens:
+        drop_tokens_stats(pipe, tokens)
+
+
+def compute_tokens_stats(*keys_):
+    """Store frequency and max score of the given token keys."""
+    pipe = DB.pipeline(transaction=False)
+    for key in keys_:
+        pipe.zcard(key)
+        pipe.zrevrange(key, 0, 0, withscores=True)
+    values = pipe.execute()
+    mapping = {}
+    for key, frequency, best in zip(keys_, values[::2], values[1::2]):
+        max_score = best[0][1] if best else 0
+        mapping[key] = "{}|{}".format(frequency, max_score)
+    if mapping:
+        DB.hset(keys.TOKENS_STATS_KEY, mapping=mapping)
+    return keys_
+
+
+def drop_tokens_stats(db, tokens):
+    # Those stats are now stale, let scripts compute them live.
+    db.hdel(keys.TOKENS_STATS_KEY, *(keys.token_key(t) for t in tokens))
 
 
 def index_geohash(pipe, key, lat, lon):
@@ -100,12 +192,12 @@ def index_geohash(pipe, key, lat, lon):
     pipe.sadd(geok, key)
 
 
-def deindex_geohash(key, lat, lon):
+def deindex_geohash(pipe, key, lat, lon):
     lat = float(lat)
     lon = float(lon)
     geoh = geohash.encode(lat, lon, config.GEOHASH_PRECISION)
     geok = keys.geohash_key(geoh)
-    DB.srem(geok, key)
+    pipe.srem(geok, key)
 
 
 def check_type_and_transform_to_array(name, values):
@@ -150,7 +242,7 @@ class FieldsIndexer:
             if values:
                 values = check_type_and_transform_to_array(name, values)
                 for value in values:
-                    tokens.extend(deindex_field(key, value))
+                    tokens.extend(deindex_field(db, key, value))
 
 
 class GeohashIndexer:
@@ -160,7 +252,7 @@ class GeohashIndexer:
 
     @staticmethod
     def deindex(db, key, doc, tokens, **kwargs):
-        deindex_geohash(key, doc["lat"], doc["lon"])
+        deindex_geohash(db, key, doc["lat"], doc["lon"])
 
 
 class HousenumbersIndexer:
@@ -169,12 +261,17 @@ class HousenumbersIndexer:
         housenumbers = doc.get("housenumbers", {})
         for number, data in housenumbers.items():
             index_geohash(pipe, key, data["lat"], data["lon"])
+        if housenumbers and config.SPLIT_HOUSENUMBERS:
+            mapping = {token: json.dumps(data) for token, data in housenumbers.items()}
+            pipe.hset(keys.housenumbers_key(doc[config.ID_FIELD]), mapping=mapping)
 
     @staticmethod
     def deindex(db, key, doc, tokens, **kwargs):
         housenumbers = doc.get("housenumbers", {})
         for token, data in housenumbers.items():
-            deindex_geohash(key, data["lat"], data["lon"])
+            deindex_geohash(db, key, data["lat"], data["lon"])
+        if config.SPLIT_HOUSENUMBERS:
+            db.delete(keys.housenumbers_key(doc[config.ID_FIELD]))
 
 
 class FiltersIndexer:
@@ -206,6 +303,35 @@ class FiltersIndexer:
             db.srem(keys.filter_key("type", "housenumber"), key)
 
 
+def housenumbers_pipeline(pipe, docs, token=None):
+    for doc in docs:
+        key = keys.housenumbers_key(doc[config.ID_FIELD])
+        if token:
+            pipe.hget(key, token)
+        else:
+            pipe.hgetall(key)
+
+
+def set_housenumbers(docs, values, token=None):
+    for doc, value in zip(docs, values):
+        if token:
+            value = {token.encode(): value} if value else {}
+        if value:
+            doc["housenumbers"] = {
+                number.decode(): json.loads(data) for number, data in value.items()
+            }
+
+
+def load_housenumbers(docs, token=None):
+    """Put back in `docs` their housenumbers stored apart (see
+    SPLIT_HOUSENUMBERS), in one round trip: only the one matching `token`
+    if given, all of them otherwise."""
+    docs = list(docs)
+    pipe = DB.pipeline(transaction=False)
+    housenumbers_pipeline(pipe, docs, token)
+    set_housenumbers(docs, pipe.execute(), token)
+
+
 @yielder
 def prepare_housenumbers(doc):
     # We need to have the housenumbers tokenized in the document, to match
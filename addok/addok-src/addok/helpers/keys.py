@@ -1,3 +1,5 @@
+import hashlib
+
 TOKEN_PREFIX = "w|"
 
 
@@ -9,9 +11,42 @@ def document_key(s):
     return "d|{}".format(s)
 
 
+def projection_key(s):
+    return "s|{}".format(s)
+
+
+def projection_key_of(key):
+    """Return the projection key of a document `key` (str or bytes)."""
+    if isinstance(key, bytes):
+        key = key.decode()
+    return projection_key(key[len(document_key("")) :])
+
+
 def geohash_key(s):
     return "g|{}".format(s)
 
 
+def housenumbers_key(s):
+    return "h|{}".format(s)
+
+
 def filter_key(k, v):
     return "f|{}|{}".format(k, v)
+
+
+def content_hash_key(s):
+    """Return the key of the hash holding the content digest of document `s`
+    (see INCREMENTAL_IMPORT): ids are spread over 4096 small hashes, which
+    Redis encodes compactly."""
+    bucket = hashlib.blake2b(str(s).encode(), digest_size=2).hexdigest()[:3]
+    return "hash|{}".format(bucket)
+
+
+# Hash of token key => "frequency|max score", built by `addok stats`.
+TOKENS_STATS_KEY = "_tokens_stats"
+
+# GEO sorted set of all documents positions, built by `addok.geo.GeoIndexer`.
+GEO_KEY = "_geo"
+
+# Hash of id => dictionary of `DictZlibSerializer`, plus "current" => id.
+SERIALIZER_DICTIONARIES_KEY = "_serializer_dictionaries"
@@ -0,0 +1,128 @@
+-- Server side version of the `bucket_with_meaningful`, `reduce_with_other_commons`
+-- and `ensure_geohash_results_are_included_if_center_is_given` collectors, to run
+-- their intersections in one round trip (see `collectors.bucket_on_server`).
+-- KEYS are the meaningful token keys, then the common ones (ordered by
+-- frequency), then the filters, then the geohash key if any.
+-- ARGV are:
+-- - unique name to be used for tmp key
+-- - the steps to run: "b" for bucket_with_meaningful, "r" for
+--   reduce_with_other_commons and "g" for the geohash one
+-- - BUCKET_MIN, BUCKET_MAX and the wanted number of results
+-- - the number of meaningful, commons and filters keys
+-- - "1" if the last key is a geohash key, "0" otherwise
+-- - then the ids already in the bucket, if any
+-- Returns the common keys added to the meaningful ones, and the bucket ids.
+local tmp = ARGV[1]
+local steps = ARGV[2]
+local bucket_min = tonumber(ARGV[3])
+local bucket_max = tonumber(ARGV[4])
+local wanted = tonumber(ARGV[5])
+local n_meaningful = tonumber(ARGV[6])
+local n_commons = tonumber(ARGV[7])
+local n_filters = tonumber(ARGV[8])
+local geohash = nil
+if ARGV[9] == '1' then
+    geohash = KEYS[#KEYS]
+end
+
+local meaningful = {}
+local is_meaningful = {}
+for i = 1, n_meaningful do
+    meaningful[#meaningful + 1] = KEYS[i]
+    is_meaningful[KEYS[i]] = true
+end
+local commons = {}
+for i = n_meaningful + 1, n_meaningful + n_commons do
+    commons[#commons + 1] = KEYS[i]
+end
+local filters = {}
+for i = n_meaningful + n_commons + 1, n_meaningful + n_commons + n_filters do
+    filters[#filters + 1] = KEYS[i]
+end
+
+local bucket = {}
+local size = 0
+local function reset()
+    bucket = {}
+    size = 0
+end
+local function add(ids)
+    for _, id in ipairs(ids) do
+        if not bucket[id] then
+            bucket[id] = true
+            size = size + 1
+        end
+    end
+end
+for i = 10, #ARGV do
+    add({ARGV[i]})
+end
+
+-- Same as Search.intersect.
+local function intersect(keys, limit)
+    if not (limit > 0) then
+        limit = math.max(wanted, bucket_max)
+    end
+    if #keys == 0 then
+        return {}
+    end
+    local all = {}
+    for _, k in ipairs(keys) do all[#all + 1] = k end
+    for _, k in ipairs(filters) do all[#all + 1] = k end
+    if #all == 1 then
+        if string.sub(all[1], 1, 2) == 'w|' then
+            return redis.call('ZREVRANGE', all[1], 0, limit - 1)
+        end
+        return redis.call('SMEMBERS', all[1])
+    end
+    local unique = {}
+    local seen = {}
+    for _, k in ipairs(all) do
+        if not seen[k] then
+            seen[k] = true
+            unique[#unique + 1] = k
+        end
+    end
+    redis.call('ZINTERSTORE', tmp, #unique, unpack(unique))
+    local ids = redis.call('ZREVRANGE', tmp, 0, limit - 1)
+    redis.call('DEL', tmp)
+    return ids
+end
+
+if string.find(steps, 'b', 1, true) then
+    if size == 0 then
+        add(intersect(meaningful, bucket_min))
+        if size == bucket_min then
+            reset()
+            add(intersect(meaningful, 0))
+        end
+    else
+        add(intersect(meaningful, bucket_max - size))
+    end
+end
+
+local added = {}
+if string.find(steps, 'r', 1, true) then
+    for _, k in ipairs(commons) do
+        if not is_meaningful[k] and size >= bucket_max then
+            meaningful[#meaningful + 1] = k
+            is_meaningful[k] = true
+            added[#added + 1] = k
+            reset()
+            add(intersect(meaningful, 0))
+        end
+    end
+end
+
+if geohash and string.find(steps, 'g', 1, true) and size >= bucket_max then
+    local keys = {}
+    for _, k in ipairs(meaningful) do keys[#keys + 1] = k end
+    keys[#keys + 1] = geohash
+    add(intersect(keys, math.max(wanted, 10)))
+end
+
+local ids = {}
+for id, _ in pairs(bucket) do
+    ids[#ids + 1] = id
+end
+return {added, ids}
@@ -0,0 +1,8 @@
+-- Remove a token from its edge ngrams, unless it is still indexed (see
+-- `EdgeNgramIndexer.deindex`), so this can be queued in an import pipeline.
+-- KEYS[1] is the token key, then the edge ngram keys; ARGV[1] is the token.
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    for i = 2, #KEYS do
+        redis.call('SREM', KEYS[i], ARGV[1])
+    end
+end
@@ -0,0 +1,75 @@
+-- Remove the pairs of tokens no more shared by any document (see
+-- `PairsIndexer.deindex`), so this can be queued in an import pipeline.
+-- KEYS are the token keys of the deindexed document, then their pair keys, in
+-- the same order; ARGV are the tokens, then optionally the lookup to start
+-- from (for tests).
+-- Only a first common document is looked for: with ZINTERCARD … LIMIT 1 when
+-- the server has it (Redis 7), else by looking up slices of the smaller set
+-- in the other one, highest scores first as searches read them, with ZMSCORE
+-- (Redis 6.2) or else ZSCORE: common tokens share documents in their first
+-- members, so slices start small and grow up to MAX_SLICE.
+local MAX_SLICE = 128
+local LOOKUPS = {zintercard = 1, zmscore = 2, zscore = 3}
+local n = #KEYS / 2
+local lookup = LOOKUPS[ARGV[n + 1] or 'zintercard']
+local cards = {}
+for i = 1, n do
+    cards[i] = redis.call('ZCARD', KEYS[i])
+end
+
+local function slice_is_shared(key, members)
+    if lookup == LOOKUPS.zmscore then
+        local scores = redis.pcall('ZMSCORE', key, unpack(members))
+        if scores.err then
+            lookup = LOOKUPS.zscore  -- Unknown command.
+        else
+            for _, score in ipairs(scores) do
+                if score then
+                    return true
+                end
+            end
+            return false
+        end
+    end
+    for _, member in ipairs(members) do
+        if redis.call('ZSCORE', key, member) then
+            return true
+        end
+    end
+    return false
+end
+
+local function share_a_document(i, j)
+    if cards[i] == 0 or cards[j] == 0 then
+        return false
+    end
+    if lookup == LOOKUPS.zintercard then
+        local count = redis.pcall('ZINTERCARD', 2, KEYS[i], KEYS[j], 'LIMIT', 1)
+        if type(count) == 'number' then
+            return count > 0
+        end
+        lookup = LOOKUPS.zmscore  -- Unknown command.
+    end
+    if cards[i] > cards[j] then
+        i, j = j, i
+    end
+    local start, size = 0, 8
+    while start < cards[i] do
+        local members = redis.call('ZREVRANGE', KEYS[i], start, start + size - 1)
+        if slice_is_shared(KEYS[j], members) then
+            return true
+        end
+        start = start + size
+        size = math.min(size * 4, MAX_SLICE)
+    end
+    return false
+end
+
+for i = 1, n do
+    for j = i + 1, n do
+        if not share_a_document(i, j) then
+            redis.call('SREM', KEYS[n + i], ARGV[j])
+            redis.call('SREM', KEYS[n + j], ARGV[i])
+        end
+    end
+end
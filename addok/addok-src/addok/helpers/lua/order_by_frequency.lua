@@ -1,7 +1,26 @@
 -- Order tokens according to their frequency
+-- ARGV[1] is the optional tokens statistics hash (see `addok stats`), values
+-- being "frequency|max score"; tokens missing from it are computed live.
 local frequency = {}
+if ARGV[1] then
+    -- Avoid unpacking too many values at once.
+    for i = 1, #KEYS, 1000 do
+        local fields = {}
+        for j = i, math.min(i + 999, #KEYS) do
+            fields[#fields + 1] = KEYS[j]
+        end
+        local values = redis.call('HMGET', ARGV[1], unpack(fields))
+        for j, k in ipairs(fields) do
+            if values[j] then
+                frequency[k] = tonumber(string.match(values[j], '^([^|]+)'))
+            end
+        end
+    end
+end
 for i,k in ipairs(KEYS) do
-    frequency[k] = redis.call('ZCARD', k)
+    if frequency[k] == nil then
+        frequency[k] = redis.call('ZCARD', k)
+    end
 end
 table.sort( KEYS, function (a, b) return frequency[a] > frequency[b] end)
 return KEYS
@@ -1,9 +1,28 @@
 -- Order tokens according to their max score in index
 -- Mainly used when autocompleting a one word search, so
 -- documents with a higher importance come first.
+-- ARGV[1] is the optional tokens statistics hash (see `addok stats`), values
+-- being "frequency|max score"; tokens missing from it are computed live.
 local score = {}
+if ARGV[1] then
+    -- Avoid unpacking too many values at once.
+    for i = 1, #KEYS, 1000 do
+        local fields = {}
+        for j = i, math.min(i + 999, #KEYS) do
+            fields[#fields + 1] = KEYS[j]
+        end
+        local values = redis.call('HMGET', ARGV[1], unpack(fields))
+        for j, k in ipairs(fields) do
+            if values[j] then
+                score[k] = tonumber(string.match(values[j], '|(.+)$'))
+            end
+        end
+    end
+end
 for i,k in ipairs(KEYS) do
-    score[k] = tonumber(redis.call('ZREVRANGE', k, 0, 1, 'WITHSCORES')[2] or 0)
+    if score[k] == nil then
+        score[k] = tonumber(redis.call('ZREVRANGE', k, 0, 1, 'WITHSCORES')[2] or 0)
+    end
 end
 table.sort( KEYS, function (a, b) return score[a] > score[b] end)
 return KEYS
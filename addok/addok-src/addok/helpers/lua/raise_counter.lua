@@ -0,0 +1,6 @@
+-- Set the counter KEYS[1] to ARGV[1], unless it is already greater (see
+-- `addok build`), so loading a build does not give again ids given since.
+local current = tonumber(redis.call('GET', KEYS[1]) or 0)
+if current < tonumber(ARGV[1]) then
+    redis.call('SET', KEYS[1], ARGV[1])
+end
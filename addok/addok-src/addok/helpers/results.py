@@ -10,6 +10,18 @@ from addok.helpers.text import (
 )
 
 
+def bounded(name, ceiling=1.0):
+    """Declare that a (costly) scoring processor adds at most a `name` score of
+    `ceiling`, with `ceiling` as ceiling: with SEARCH_LAZY_SCORING, it is then
+    only run for the results that can still enter the top ones."""
+
+    def decorator(func):
+        func.bound = (name, ceiling)
+        return func
+
+    return decorator
+
+
 def make_labels(helper, result):
     if not result.labels:
         # Make your own for better scoring (see addok-france for inspiration).
@@ -29,13 +41,17 @@ def make_labels(helper, result):
         result.labels[0] = label
 
 
-def match_housenumber(helper, result):
-    if not helper.check_housenumber:
-        return
+def queried_housenumber(helper):
     # Housenumber may have multiple tokens (eg. "dix huit"), we join
     # those to match the way they have been processed by
     # addok.helpers.index.prepare_housenumbers.
-    raw = "".join(sorted(helper.housenumbers, key=lambda t: t.position))
+    return "".join(sorted(helper.housenumbers, key=lambda t: t.position))
+
+
+def match_housenumber(helper, result):
+    if not helper.check_housenumber:
+        return
+    raw = queried_housenumber(helper)
     if raw and raw in result.housenumbers:
         data = result.housenumbers[str(raw)]
         result.housenumber = data.pop("raw")
@@ -57,6 +73,7 @@ def score_by_importance(helper, result):
     )
 
 
+@bounded("str_distance")
 def score_by_autocomplete_distance(helper, result):
     if not helper.autocomplete:
         return
@@ -83,6 +100,7 @@ def _score_by_str_distance(helper, result, scale=1.0):
         result.add_score("str_distance", score, ceiling=1.0)
 
 
+@bounded("str_distance")
 def score_by_str_distance(helper, result):
     if helper.autocomplete:
         return
@@ -98,6 +116,7 @@ def _score_by_ngram_distance(helper, result, scale=1.0):
             break
 
 
+@bounded("str_distance")
 def score_by_ngram_distance(helper, result):
     if helper.autocomplete:
         return
@@ -2,6 +2,7 @@ from math import ceil
 
 from addok.config import config
 from addok.helpers import iter_pipe
+from addok.helpers.index import token_keys_frequencies
 
 
 def preprocess_query(s):
@@ -17,8 +18,18 @@ def tokenize(helper):
 
 
 def search_tokens(helper):
+    # Resolve existence and frequency of all tokens in one round trip (none
+    # when already resolved by a batch): a token is in the index as soon as
+    # its frequency is not null.
+    batch = getattr(helper, "batch", None)
+    known = batch.frequencies if batch is not None else {}
+    missing = [token.key for token in helper.tokens if token.key not in known]
+    resolved = dict(zip(missing, token_keys_frequencies(*missing)))
     for token in helper.tokens:
-        token.search()
+        frequency = known.get(token.key, resolved.get(token.key))
+        token.frequency = frequency
+        if frequency:
+            token.db_key = token.key
 
 
 def set_should_match_threshold(helper):
@@ -1,5 +1,15 @@
 import json
+import re
+import struct
 import zlib
+from collections import Counter
+
+from addok.config import config
+from addok.db import DB
+from addok.helpers import keys
+
+# Keys and values of compact JSON, with their delimiters.
+FRAGMENTS = re.compile(rb'"(?:[^"\\]|\\.)*"[:,]?|[-0-9.]+[,}]?')
 
 
 class ZlibSerializer:
@@ -10,3 +20,120 @@ class ZlibSerializer:
     @classmethod
     def loads(cls, data):
         return json.loads(zlib.decompress(data).decode())
+
+
+class DictZlibSerializer:
+    """Compact JSON deflated with a dictionary trained on the documents.
+
+    Documents being small and alike, most of their size is made of keys and
+    common values, that a preset dictionary lets deflate reference instead of
+    storing them in each document. Dictionaries are stored in Redis, keyed by
+    their checksum which prefixes each blob, so a new dictionary does not make
+    previous blobs unreadable (use `addok reencode` to migrate them). The
+    first documents of each process are kept as training sample, until a
+    dictionary is known.
+    Blobs not starting with `MARKER` are read as `ZlibSerializer` ones.
+    """
+
+    MARKER = b"\xda"
+    HEADER = struct.Struct(">cI")  # Marker, dictionary id (0 for none).
+    dictionaries = {}  # Id => dictionary, never changing for a given id.
+    current = None  # Id of the dictionary used for dumping, once known.
+    samples = []
+
+    @staticmethod
+    def encode(data):
+        return json.dumps(data, separators=(",", ":")).encode()
+
+    @classmethod
+    def dumps(cls, data):
+        raw = cls.encode(data)
+        if cls.current is None:
+            cls.sample(raw)
+        id_ = cls.current or 0
+        if id_:
+            compressor = zlib.compressobj(wbits=-15, zdict=cls.dictionaries[id_])
+        else:
+            compressor = zlib.compressobj(wbits=-15)
+        blob = compressor.compress(raw) + compressor.flush()
+        return cls.HEADER.pack(cls.MARKER, id_) + blob
+
+    @classmethod
+    def loads(cls, data):
+        if data[:1] != cls.MARKER:
+            return ZlibSerializer.loads(data)
+        _, id_ = cls.HEADER.unpack_from(data)
+        if id_:
+            decompressor = zlib.decompressobj(wbits=-15, zdict=cls.dictionary(id_))
+        else:
+            decompressor = zlib.decompressobj(wbits=-15)
+        return json.loads(decompressor.decompress(data[cls.HEADER.size :]))
+
+    @classmethod
+    def dictionary(cls, id_):
+        if id_ not in cls.dictionaries:
+            dictionary = DB.hget(keys.SERIALIZER_DICTIONARIES_KEY, id_)
+            if dictionary is None:
+                raise ValueError("Unknown serializer dictionary {}".format(id_))
+            cls.dictionaries[id_] = dictionary
+        return cls.dictionaries[id_]
+
+    @classmethod
+    def sample(cls, raw):
+        if not cls.samples:  # Another process may have trained it already.
+            id_ = DB.hget(keys.SERIALIZER_DICTIONARIES_KEY, "current")
+            if id_ is not None:
+                cls.current = int(id_)
+                cls.dictionary(cls.current)
+                return
+        cls.samples.append(raw)
+        if len(cls.samples) >= config.SERIALIZER_DICTIONARY_SAMPLE:
+            cls.train(cls.samples)
+
+    @classmethod
+    def train(cls, samples, force=False):
+        """Build a dictionary from `samples` (JSON dumped documents), and use
+        it unless another one is already current (or `force` is true)."""
+        dictionary = train_dictionary(samples, config.SERIALIZER_DICTIONARY_SIZE)
+        id_ = zlib.crc32(dictionary) or 1
+        pipe = DB.pipeline()
+        pipe.hset(keys.SERIALIZER_DICTIONARIES_KEY, id_, dictionary)
+        if force:
+            pipe.hset(keys.SERIALIZER_DICTIONARIES_KEY, "current", id_)
+        else:
+            pipe.hsetnx(keys.SERIALIZER_DICTIONARIES_KEY, "current", id_)
+        pipe.hget(keys.SERIALIZER_DICTIONARIES_KEY, "current")
+        cls.dictionaries[id_] = dictionary
+        cls.current = int(pipe.execute()[-1])
+        cls.dictionary(cls.current)
+        cls.samples = []
+        return cls.current
+
+    @classmethod
+    def reset(cls):
+        """Forget the current dictionary, so next dumps look for it again."""
+        cls.current = None
+        cls.samples = []
+
+
+def train_dictionary(samples, size):
+    """Return a deflate preset dictionary made of the JSON fragments (keys and
+    values) saving the most bytes over `samples`. Deflate references closer
+    bytes with shorter codes, so the most valuable ones come last."""
+    counts = Counter()
+    for sample in samples:
+        counts.update(set(FRAGMENTS.findall(sample)))
+    fragments = [
+        fragment
+        for fragment, count in counts.items()
+        if count > 1 and len(fragment) > 2
+    ]
+    fragments.sort(key=lambda f: counts[f] * len(f), reverse=True)
+    selected = []
+    total = 0
+    for fragment in fragments:
+        if total + len(fragment) > size:
+            break
+        selected.append(fragment)
+        total += len(fragment)
+    return b"".join(reversed(selected))
@@ -1,9 +1,9 @@
 import re
+from collections import Counter
 from functools import lru_cache
 from pathlib import Path
 
 import editdistance
-from ngram import NGram
 from unidecode import unidecode
 
 from addok.config import config
@@ -72,6 +72,10 @@ class Token(str):
             self._frequency = token_frequency(self)
         return self._frequency
 
+    @frequency.setter
+    def frequency(self, value):
+        self._frequency = value
+
     @property
     def key(self):
         if not hasattr(self, "_key"):
@@ -162,14 +166,31 @@ def ngrams(text, n=3):
     return set([text[i : i + n] for i in range(0, len(text) - (n - 1))])
 
 
+@lru_cache(maxsize=4096)
+def padded_ngrams(text, n, pad_len):
+    # Counted, as repeated ngrams must be matched as many times.
+    text = "$" * pad_len + text + "$" * pad_len
+    return Counter([text[i : i + n] for i in range(len(text) - n + 1)]), len(text)
+
+
 def compare_ngrams(left, right, N=2, pad_len=0):
+    """Same similarity as `ngram.NGram.compare`, but with the ngrams of each
+    string computed once: the query ones are then shared by all results."""
     left = ascii(left)
     right = ascii(right)
     if len(left) == 1 and len(right) == 1:
         # NGram.compare returns 0.0 for 1 letter comparison, even if letters
         # are equal.
         return 1.0 if left == right else 0.0
-    return NGram.compare(left, right, N=N, pad_len=pad_len)
+    left_grams, left_len = padded_ngrams(left, N, pad_len)
+    right_grams, right_len = padded_ngrams(right, N, pad_len)
+    same = 0
+    for gram, count in right_grams.items():
+        if gram in left_grams:
+            same += min(count, left_grams[gram])
+    if not same:
+        return 0.0
+    return same / (left_len + right_len - 2 * N - same + 2)
 
 
 def compare_str(left, right):
@@ -75,3 +75,13 @@ def register_command(subparsers):
 @spec
 def register_shell_command(cmd):
     """Register command for Addok shell."""
+
+
+@spec
+def record_cache_operation(operation, result):
+    """Called on each cache lookup, with result being "hit" or "miss"."""
+
+
+@spec
+def record_sqlite_operation(operation_type):
+    """Called on each `SQLiteStore` operation ("fetch", "upsert" or "remove")."""
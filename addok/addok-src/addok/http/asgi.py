@@ -0,0 +1,65 @@
+"""ASGI application, running searches on redis.asyncio so one process can
+handle many concurrent requests. Run it with any ASGI server, eg.:
+
+    uvicorn addok.http.asgi:application
+
+Only the core endpoints are exposed: endpoints and middlewares registered by
+plugins target the WSGI application.
+"""
+
+import time
+
+import falcon.asgi
+
+from addok import aio
+from addok.config import config
+from addok.db import AsyncDB
+from addok.helpers.text import EntityTooLarge
+
+from . import base
+
+config.load()
+
+
+class Search(base.Search):
+    async def on_get(self, req, resp, **kwargs):
+        query, limit, autocomplete, lon, lat, filters = self.parse(req)
+        timer = time.perf_counter()
+        try:
+            results = await aio.search(
+                query,
+                limit=limit,
+                autocomplete=autocomplete,
+                lat=lat,
+                lon=lon,
+                **filters
+            )
+        except EntityTooLarge as e:
+            raise falcon.HTTPContentTooLarge(title=str(e))
+        self.respond(req, resp, results, timer, query, limit, lon, lat, filters)
+
+
+class Reverse(base.Reverse):
+    async def on_get(self, req, resp, **kwargs):
+        lon, lat, limit, filters = self.parse(req)
+        results = await aio.reverse(lat=lat, lon=lon, limit=limit, **filters)
+        self.render(req, resp, results, filters=filters, limit=limit)
+
+
+class Health(base.Health):
+    async def on_get(self, req, resp):
+        info = await AsyncDB.info()
+        return self.json(
+            req,
+            resp,
+            {"status": "HEALTHY", "redis_version": info.get("redis_version")},
+        )
+
+
+application = api = falcon.asgi.App(middleware=[base.CorsMiddleware()])
+# Do not let Falcon split query string on commas.
+application.req_options.auto_parse_qs_csv = False
+application.req_options.strip_url_path_trailing_slash = True
+application.add_route("/search", Search())
+application.add_route("/reverse", Reverse())
+application.add_route("/health", Health())
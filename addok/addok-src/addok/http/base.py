@@ -1,4 +1,3 @@
-import json
 import logging
 import logging.handlers
 from pathlib import Path
@@ -9,6 +8,7 @@ import falcon
 from addok.config import config
 from addok.core import reverse, search
 from addok.db import DB
+from addok.helpers.formatters import dumps
 from addok.helpers.text import EntityTooLarge
 
 notfound_logger = None
@@ -80,6 +80,9 @@ class CorsMiddleware:
         resp.set_header("Access-Control-Allow-Origin", "*")
         resp.set_header("Access-Control-Allow-Headers", "X-Requested-With")
 
+    async def process_response_async(self, req, resp, resource, req_succeeded):
+        self.process_response(req, resp, resource, req_succeeded)
+
 
 class View:
 
@@ -114,7 +117,7 @@ class View:
     to_geojson = render  # retrocompat.
 
     def json(self, req, resp, content):
-        resp.text = json.dumps(content)
+        resp.text = dumps(content)
         resp.content_type = "application/json; charset=utf-8"
 
     def parse_float(sel, req, *keys):
@@ -140,6 +143,22 @@ class View:
 
 class Search(View):
     def on_get(self, req, resp, **kwargs):
+        query, limit, autocomplete, lon, lat, filters = self.parse(req)
+        timer = time.perf_counter()
+        try:
+            results = search(
+                query,
+                limit=limit,
+                autocomplete=autocomplete,
+                lat=lat,
+                lon=lon,
+                **filters
+            )
+        except EntityTooLarge as e:
+            raise falcon.HTTPContentTooLarge(title=str(e))
+        self.respond(req, resp, results, timer, query, limit, lon, lat, filters)
+
+    def parse(self, req):
         query = req.get_param("q")
         if not query:
             raise falcon.HTTPMissingParam("q")
@@ -152,28 +171,19 @@ class Search(View):
             # https://github.com/falconry/falcon/pull/493#discussion_r44376219
             autocomplete = True
         lon, lat = self.parse_lon_lat(req)
-        center = None
-        if lon and lat:
-            center = (lon, lat)
         filters = self.match_filters(req)
-        timer = time.perf_counter()
-        try:
-            results = search(
-                query,
-                limit=limit,
-                autocomplete=autocomplete,
-                lat=lat,
-                lon=lon,
-                **filters
-            )
-        except EntityTooLarge as e:
-            raise falcon.HTTPContentTooLarge(title=str(e))
+        return query, limit, autocomplete, lon, lat, filters
+
+    def respond(self, req, resp, results, timer, query, limit, lon, lat, filters):
         timer = int((time.perf_counter() - timer) * 1000)
         if not results:
             log_notfound(query)
         log_query(query, results)
         if config.SLOW_QUERIES and timer > config.SLOW_QUERIES:
             log_slow_query(query, results, timer)
+        center = None
+        if lon and lat:
+            center = (lon, lat)
         self.render(
             req, resp, results, query=query, filters=filters, center=center, limit=limit
         )
@@ -181,6 +191,11 @@ class Search(View):
 
 class Reverse(View):
     def on_get(self, req, resp, **kwargs):
+        lon, lat, limit, filters = self.parse(req)
+        results = reverse(lat=lat, lon=lon, limit=limit, **filters)
+        self.render(req, resp, results, filters=filters, limit=limit)
+
+    def parse(self, req):
         lon, lat = self.parse_lon_lat(req)
         if lon is None:
             raise falcon.HTTPMissingParam("lon")
@@ -188,8 +203,7 @@ class Reverse(View):
             raise falcon.HTTPMissingParam("lat")
         limit = req.get_param_as_int("limit") or 1
         filters = self.match_filters(req)
-        results = reverse(lat=lat, lon=lon, limit=limit, **filters)
-        self.render(req, resp, results, filters=filters, limit=limit)
+        return lon, lat, limit, filters
 
 
 class Health(View):
@@ -0,0 +1,247 @@
+"""Read-only friendly document store, made of two files:
+
+- `<MMAP_STORE_PATH>.data`, where each `upsert` or `remove` appends records
+  (key length, blob length, key, blob; a removal is a record without blob);
+- `<MMAP_STORE_PATH>.idx`, written by `compact`: a header telling how much of
+  the data file it covers, then the sorted keys hashes and the matching
+  records offsets, as two arrays of native 64 bits integers.
+
+Both are opened with `mmap`, so documents are read from the page cache shared
+by all the workers of a host. Records appended after the last compaction are
+scanned once by each worker (when the index generation changes) into an in
+memory overlay: run `addok compact` after an import to rewrite both files with
+only the live documents, and keep that overlay empty.
+
+To use it:
+
+    DOCUMENT_STORE_PYPATH = "addok.mmapstore.MMapStore"
+    MMAP_STORE_PATH = "/srv/addok/documents"
+"""
+
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+from array import array
+from bisect import bisect_left
+
+from addok.config import config
+from addok.helpers.cache import bump_generation, index_generation
+
+RECORD = struct.Struct("<II")  # Key length, blob length.
+REMOVED = 0xFFFFFFFF  # Blob length of a removal record.
+HEADER = struct.Struct("<8sQQ")  # Magic, covered data size, entries count.
+MAGIC = b"addokidx"
+
+
+def key_hash(key):
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+
+
+def as_bytes(key):
+    return key.encode() if isinstance(key, str) else key
+
+
+def open_map(path):
+    """Map the whole file at `path`, or return None if empty or missing."""
+    try:
+        with open(path, "rb") as f:
+            if not os.fstat(f.fileno()).st_size:
+                return None
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except FileNotFoundError:
+        return None
+
+
+def inode(path):
+    try:
+        return os.stat(path).st_ino
+    except FileNotFoundError:
+        return None
+
+
+def iter_records(data, start, end):
+    """Yield (key, offset, removed) for each record of `data` in [start, end)."""
+    offset = start
+    while offset < end:
+        key_length, blob_length = RECORD.unpack_from(data, offset)
+        key_start = offset + RECORD.size
+        key = data[key_start : key_start + key_length]
+        removed = blob_length == REMOVED
+        yield key, offset, removed
+        offset = key_start + key_length + (0 if removed else blob_length)
+
+
+def pack_record(key, blob=None):
+    key = as_bytes(key)
+    if blob is None:
+        return RECORD.pack(len(key), REMOVED) + key
+    return RECORD.pack(len(key), len(blob)) + key + blob
+
+
+class MMapStore:
+    def __init__(self, path=None):
+        self.path = path or config.MMAP_STORE_PATH
+        self.data_path = self.path + ".data"
+        self.index_path = self.path + ".idx"
+        self.lock_path = self.path + ".lock"
+        self.generation = None
+        self.data = None
+        self.index = None
+        self.hashes = []
+        self.offsets = []
+        self.overlay = {}  # Key => offset, or None if removed.
+        self.scanned = 0  # Size of the data covered by index and overlay.
+        self.identity = None
+
+    def lock(self, operation):
+        """Lock the store, so readers never see half written records nor a data
+        file not matching the index. Closing the returned fd releases it."""
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(fd, operation)
+        return fd
+
+    def refresh(self):
+        """Map again the files if they have been written since last call."""
+        generation = index_generation()
+        if generation == self.generation and self.identity is not None:
+            return
+        self.generation = generation
+        fd = self.lock(fcntl.LOCK_SH)
+        try:
+            identity = (inode(self.data_path), inode(self.index_path))
+            size = os.stat(self.data_path).st_size if identity[0] else 0
+            if identity != self.identity or size < self.scanned:
+                self.load_index()
+                self.identity = identity
+            if size > self.scanned:
+                self.data = open_map(self.data_path)
+                self.scan_tail(size)
+        finally:
+            os.close(fd)
+
+    def load_index(self):
+        self.index = open_map(self.index_path)
+        self.overlay = {}
+        self.scanned = 0
+        self.hashes = self.offsets = []
+        self.data = open_map(self.data_path)
+        if self.index is not None:
+            magic, self.scanned, count = HEADER.unpack_from(self.index, 0)
+            if magic != MAGIC:
+                raise ValueError("Invalid index file {}".format(self.index_path))
+            # Views on the map, so workers do not copy the index.
+            view = memoryview(self.index)[HEADER.size :].cast("Q")
+            self.hashes = view[:count]
+            self.offsets = view[count : count * 2]
+
+    def scan_tail(self, end):
+        for key, offset, removed in iter_records(self.data, self.scanned, end):
+            self.overlay[key] = None if removed else offset
+        self.scanned = end
+
+    def offset(self, key):
+        if key in self.overlay:
+            return self.overlay[key]
+        hash_ = key_hash(key)
+        i = bisect_left(self.hashes, hash_)
+        while i < len(self.hashes) and self.hashes[i] == hash_:
+            if self.record_key(self.offsets[i]) == key:
+                return self.offsets[i]
+            i += 1  # Hash collision.
+        return None
+
+    def record_key(self, offset):
+        key_length, _ = RECORD.unpack_from(self.data, offset)
+        start = offset + RECORD.size
+        return self.data[start : start + key_length]
+
+    def blob(self, offset):
+        key_length, blob_length = RECORD.unpack_from(self.data, offset)
+        start = offset + RECORD.size + key_length
+        return self.data[start : start + blob_length]
+
+    def fetch(self, *keys):
+        self.refresh()
+        if self.data is None:
+            return
+        for key in keys:
+            offset = self.offset(as_bytes(key))
+            if offset is not None:
+                yield key, self.blob(offset)
+
+    def scan(self):
+        self.refresh()
+        data = self.data
+        offsets = [o for o in self.offsets if self.record_key(o) not in self.overlay]
+        offsets.extend(o for o in self.overlay.values() if o is not None)
+        for offset in offsets:
+            key_length, blob_length = RECORD.unpack_from(data, offset)
+            start = offset + RECORD.size
+            key = data[start : start + key_length]
+            yield key, data[start + key_length : start + key_length + blob_length]
+
+    def append(self, records):
+        lock = self.lock(fcntl.LOCK_EX)
+        try:
+            with open(self.data_path, "ab") as f:
+                f.write(b"".join(records))
+        finally:
+            os.close(lock)
+        self.generation = None  # Read own writes.
+
+    def upsert(self, *docs):
+        self.append(pack_record(key, blob) for key, blob in docs)
+
+    def remove(self, *keys):
+        self.append(pack_record(key) for key in keys)
+
+    def flushdb(self):
+        lock = self.lock(fcntl.LOCK_EX)
+        try:
+            for path in [self.data_path, self.index_path]:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+        finally:
+            os.close(lock)
+        self.generation = None
+
+    def compact(self):
+        """Rewrite the data file with only the live documents, and index them.
+
+        Files are replaced atomically: workers keep reading the old ones until
+        they see the bumped index generation.
+        """
+        lock = self.lock(fcntl.LOCK_EX)
+        try:
+            data = open_map(self.data_path)
+            live = {}
+            if data is not None:
+                for key, offset, removed in iter_records(data, 0, len(data)):
+                    if removed:
+                        live.pop(key, None)
+                    else:
+                        live[key] = offset
+            entries = []
+            offset = 0
+            with open(self.data_path + ".tmp", "wb") as f:
+                for key, source in live.items():
+                    key_length, blob_length = RECORD.unpack_from(data, source)
+                    size = RECORD.size + key_length + blob_length
+                    f.write(data[source : source + size])
+                    entries.append((key_hash(key), offset))
+                    offset += size
+            entries.sort()
+            with open(self.index_path + ".tmp", "wb") as f:
+                f.write(HEADER.pack(MAGIC, offset, len(entries)))
+                f.write(array("Q", (hash_ for hash_, _ in entries)).tobytes())
+                f.write(array("Q", (offset for _, offset in entries)).tobytes())
+            os.rename(self.index_path + ".tmp", self.index_path)
+            os.rename(self.data_path + ".tmp", self.data_path)
+        finally:
+            os.close(lock)
+        bump_generation()
+        return len(entries)
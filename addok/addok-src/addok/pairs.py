@@ -1,5 +1,5 @@
 from addok.db import DB
-from addok.helpers import keys, magenta, white
+from addok.helpers import keys, magenta, scripts, white
 from addok.helpers.search import preprocess_query
 
 
@@ -18,18 +18,10 @@ class PairsIndexer:
     @staticmethod
     def deindex(db, key, doc, tokens, **kwargs):
         tokens = list(set(tokens))  # Unique values.
-        for i, token in enumerate(tokens):
-            for token2 in tokens[i:]:
-                if token != token2:
-                    tmp_key = "|".join(["didx", token, token2])
-                    # Do we have other documents that share token and token2?
-                    commons = db.zinterstore(
-                        tmp_key, [keys.token_key(token), keys.token_key(token2)]
-                    )
-                    db.delete(tmp_key)
-                    if not commons:
-                        db.srem(pair_key(token), token2)
-                        db.srem(pair_key(token2), token)
+        if len(tokens) > 1:
+            token_keys = [keys.token_key(token) for token in tokens]
+            pair_keys = [pair_key(token) for token in tokens]
+            scripts.deindex_pairs(keys=token_keys + pair_keys, args=tokens, client=db)
 
 
 def pair(cmd, word):
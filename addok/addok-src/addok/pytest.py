@@ -29,6 +29,7 @@ def pytest_configure():
     logging.basicConfig(level=logging.DEBUG)
     addok_config.REDIS["indexes"]["db"] = 14
     addok_config.REDIS["documents"]["db"] = 15
+    addok_config.REINDEX_DBS = {"indexes": 12, "documents": 13}
     addok_config.load()
 
 
@@ -44,9 +45,11 @@ def pytest_runtest_setup(item):
 def pytest_runtest_teardown(item, nextitem):
     from addok import db, ds
     from addok.config import config as addok_config
+    from addok.helpers.cache import forget_generation
 
     assert db.DB.connection_pool.connection_kwargs["db"] == 14
     db.DB.flushdb()
+    forget_generation()
     if addok_config.DOCUMENT_STORE == ds.RedisStore:
         assert ds._DB.connection_pool.connection_kwargs["db"] == 15
         ds._DB.flushdb()
@@ -10,7 +10,7 @@ import geohash
 
 from . import hooks
 from .config import config
-from .core import Result, Search, compute_geohash_key, reverse
+from .core import Result, Search, compute_geohash_key, reverse, search, search_many
 from .db import DB
 from .ds import get_document
 from .helpers import (
@@ -26,7 +26,7 @@ from .helpers import (
     white,
     yellow,
 )
-from .helpers.index import token_frequency
+from .helpers.index import load_housenumbers, token_frequency
 from .helpers.search import preprocess_query
 from .helpers.text import compare_str
 
@@ -239,6 +239,27 @@ class Cmd(cmd.Cmd):
             count = 100
         self._search(query, count=count)
 
+    def do_BENCHMANY(self, args):
+        """Compare searching each line of a file one by one and by chunks.
+        BENCHMANY path/to/queries.txt [CHUNK 1000]"""
+        chunk = 1000
+        if "CHUNK" in args:
+            args, chunk = self._match_option("CHUNK", args)
+            chunk = int(chunk)
+        with open(args.strip()) as f:
+            queries = [line.strip() for line in f if line.strip()]
+        start = time.time()
+        for query in queries:
+            search(query)
+        one_by_one = len(queries) / (time.time() - start)
+        start = time.time()
+        for i in range(0, len(queries), chunk):
+            search_many(queries[i : i + chunk])
+        many = len(queries) / (time.time() - start)
+        print(white("{} queries".format(len(queries))))
+        print("search: {}".format(magenta("{} rows/s".format(round(one_by_one)))))
+        print("search_many: {}".format(magenta("{} rows/s".format(round(many)))))
+
     def do_INTERSECT(self, words):
         """Do a raw intersect between tokens (default limit 100).
         INTERSECT rue des lilas [LIMIT 100]"""
@@ -375,6 +396,8 @@ class Cmd(cmd.Cmd):
         doc = doc_by_id(_id)
         if not doc:
             return self.error('id "{}" not found'.format(_id))
+        if config.SPLIT_HOUSENUMBERS:
+            load_housenumbers([doc])
         for key, value in doc.items():
             if key == config.HOUSENUMBERS_FIELD:
                 continue
@@ -412,6 +435,8 @@ class Cmd(cmd.Cmd):
         doc = doc_by_id(_id)
         if not doc:
             return self.error('id "{}" not found'.format(_id))
+        if config.SPLIT_HOUSENUMBERS:
+            load_housenumbers([doc])
         for field in config.FIELDS:
             key = field["key"]
             if key in doc:
@@ -0,0 +1,155 @@
+import asyncio
+
+import pytest
+
+from addok import aio
+from addok.core import reverse, search
+
+
+@pytest.fixture
+def asgi_client():
+    from falcon import testing
+
+    from addok.http.asgi import application
+
+    return testing.TestClient(application)
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+@pytest.mark.parametrize(
+    "query,params",
+    [
+        ("rue des lilas", {}),
+        ("lilas", {"autocomplete": True}),
+        ("lila", {"autocomplete": True}),
+        ("rue des lilsa", {}),
+        ("rue des lilas", {"lat": 48.32, "lon": 2.25}),
+        ("rue des lilas", {"type": "street"}),
+        ("11 rue des lilas", {}),
+        ("rue", {}),
+    ],
+)
+def test_async_search_returns_same_results_as_sync_one(factory, query, params):
+    factory(name="rue des lilas", city="Paris")
+    factory(name="rue des lilas", city="Lyon", lat=45.76, lon=4.83)
+    factory(name="rue des lilacs", type="city")
+    factory(name="rue des lilas", housenumbers={"11": {"lat": "48.32", "lon": "2.25"}})
+    expected = [(r.id, r.score, str(r)) for r in search(query, **params)]
+    results = run(aio.search(query, **params))
+    assert [(r.id, r.score, str(r)) for r in results] == expected
+
+
+def test_async_search_can_run_concurrently(factory):
+    factory(name="rue des lilas")
+    factory(name="avenue des roses")
+
+    async def main():
+        return await asyncio.gather(
+            *(aio.search(q) for q in ["lilas", "roses", "tulipes"] * 10)
+        )
+
+    results = run(main())
+    assert [str(r[0]) if r else None for r in results[:3]] == [
+        "rue des lilas",
+        "avenue des roses",
+        None,
+    ]
+
+
+def test_async_search_awaits_async_collectors(factory, config):
+    factory(name="rue des lilas")
+    calls = []
+
+    async def collector(helper):
+        calls.append(list(helper.bucket))
+        return True
+
+    config.RESULTS_COLLECTORS = [collector] + config.RESULTS_COLLECTORS
+    assert run(aio.search("lilas")) == []
+    assert calls == [[]]
+
+
+def test_async_reverse_returns_same_results_as_sync_one(factory):
+    factory(name="rue des lilas", lat=48.234545, lon=5.235445)
+    factory(name="rue des roses", lat=48.234546, lon=5.235446, type="city")
+    factory(housenumbers={"24": {"lat": 48.234545, "lon": 5.235445}})
+    for params in [{}, {"limit": 3}, {"type": "city"}, {"type": "housenumber"}]:
+        expected = reverse(lat=48.234545, lon=5.235445, **params)
+        results = run(aio.reverse(lat=48.234545, lon=5.235445, **params))
+        assert [(r.id, r.housenumber) for r in results] == [
+            (r.id, r.housenumber) for r in expected
+        ]
+
+
+def test_async_reverse_uses_configured_helper(factory, config, monkeypatch):
+    from addok.geo import GeoIndexer, GeoReverse
+
+    config.INDEXERS = config.INDEXERS + [GeoIndexer]
+    config.REVERSE_HELPER = GeoReverse
+    factory(lat=48.237545, lon=5.235445)
+    good = factory(lat=48.234546, lon=5.235446)
+    calls = []
+    search = GeoReverse.search
+
+    def spy(self, radius, count):
+        calls.append(radius)
+        return search(self, radius, count)
+
+    monkeypatch.setattr(GeoReverse, "search", spy)
+    results = run(aio.reverse(lat=48.234545, lon=5.235445))
+    assert [r.id for r in results] == [good["id"]]
+    assert calls
+
+
+def test_asgi_search(asgi_client, factory):
+    factory(name="rue des avions")
+    resp = asgi_client.simulate_get("/search", params={"q": "avions", "limit": 2})
+    assert resp.status_code == 200
+    assert resp.headers["Access-Control-Allow-Origin"] == "*"
+    assert resp.json["query"] == "avions"
+    assert resp.json["limit"] == 2
+    assert resp.json["features"][0]["properties"]["name"] == "rue des avions"
+
+
+def test_asgi_search_without_query_should_return_400(asgi_client):
+    assert asgi_client.simulate_get("/search").status_code == 400
+
+
+def test_asgi_reverse(asgi_client, factory):
+    factory(name="rue des avions", lat=44, lon=4)
+    resp = asgi_client.simulate_get("/reverse", params={"lat": 44, "lon": 4})
+    assert resp.status_code == 200
+    assert resp.json["features"][0]["properties"]["name"] == "rue des avions"
+
+
+def test_asgi_health(asgi_client):
+    resp = asgi_client.simulate_get("/health")
+    assert resp.json["status"] == "HEALTHY"
+    assert resp.json["redis_version"]
+
+
+def test_async_search_with_projections(factory, config):
+    config.DOCUMENT_PROJECTION_FIELDS = ["name", "city", "lat", "lon"]
+    factory(name="rue des lilas", city="Paris", extra="full")
+    factory(name="rue des lilas", city="Lyon", extra="full")
+    expected = [(r.id, r.score, r.extra) for r in search("rue des lilas")]
+    results = run(aio.search("rue des lilas"))
+    assert [(r.id, r.score, r.extra) for r in results] == expected
+    assert results[0].extra == "full"
+
+
+def test_asgi_search_with_geojson_fragments(asgi_client, factory, config):
+    from addok.helpers.formatters import geojson_fragment
+
+    config.RESULTS_FORMATTERS = [geojson_fragment]
+    factory(name="rue des avions", city="Paris")
+    factory(name="rue des avions", city="Lyon")
+    for _ in range(2):
+        resp = asgi_client.simulate_get("/search", params={"q": "avions"})
+        assert resp.json["query"] == "avions"
+        properties = [f["properties"] for f in resp.json["features"]]
+        assert sorted(p["city"] for p in properties) == ["Lyon", "Paris"]
+        assert all(p["label"] and p["score"] for p in properties)
@@ -1,6 +1,8 @@
 import json
 
-from addok.batch import process_documents, reset
+import redis
+
+from addok.batch import process_documents, reset, stats
 from addok.core import search
 from addok.db import DB
 
@@ -29,6 +31,41 @@ def test_process_should_update_if_action_is_given(factory):
     assert not search("rue")
 
 
+def test_process_should_deindex_a_chunk_in_one_fetch(factory, monkeypatch):
+    from addok.ds import DS
+
+    docs = [factory(name="rue de l'avoine {}".format(i)) for i in range(3)]
+    other = factory(name="rue du blé")
+    calls = []
+    fetch = DS.fetch
+
+    def spy(*keys):
+        calls.append(keys)
+        return fetch(*keys)
+
+    monkeypatch.setitem(vars(DS), "fetch", spy)
+    updates = []
+    for i, doc in enumerate(docs):
+        doc = dict(doc, name="avenue de l'avoine {}".format(i), _action="update")
+        updates.append(json.dumps(doc))
+    updates.append(json.dumps({"_action": "delete", "_id": other["_id"]}))
+    process_documents(*updates)
+    assert len(calls) == 1
+    assert len(search("avenue de l'avoine", limit=10)) == 3
+    assert not search("rue")
+    assert not search("blé")
+    assert not DB.exists("n|ble")
+    assert DB.exists("n|avoi")
+
+
+def test_index_documents_should_fetch_replaced_documents(factory):
+    from addok.helpers.index import index_documents
+
+    doc = factory(name="rue de l'avoine")
+    list(index_documents([{"_action": "delete", "_id": doc["_id"]}]))
+    assert not search("avoine")
+
+
 def test_reset(factory, monkeypatch):
     class Args:
         force = False
@@ -51,3 +88,173 @@ def test_force_reset(factory):
     assert DB.keys()
     reset(Args())
     assert not DB.keys()
+
+
+def test_stats(factory):
+    factory(name="rue des lilas", importance=1)
+    factory(name="rue des lilas", city="Paris")
+    stats()
+    frequency, max_score = DB.hget("_tokens_stats", "w|lilas").split(b"|")
+    assert frequency == b"2"
+    assert float(max_score) == DB.zrevrange("w|lilas", 0, 0, withscores=True)[0][1]
+    assert DB.hget("_tokens_stats", "w|paris") == b"1|1.0"
+
+
+def test_stats_are_dropped_when_stale(factory):
+    doc = factory(name="rue des lilas")
+    stats()
+    assert DB.hexists("_tokens_stats", "w|lilas")
+    doc["_action"] = "update"
+    doc["name"] = "avenue des lilas"
+    process_documents(json.dumps(doc.copy()))
+    assert not DB.hexists("_tokens_stats", "w|lilas")
+    assert not DB.hexists("_tokens_stats", "w|rue")
+    assert not DB.hexists("_tokens_stats", "w|avenue")
+
+
+class ReindexArgs:
+    min_ratio = 0.9
+    stats = False
+    keep = False
+    force = False
+
+
+def test_reindex_swaps_databases(factory, config, tmp_path):
+    from addok import ds
+    from addok.batch import reindex, staging_params
+    from addok.helpers.cache import index_generation
+
+    config.INDEX_EDGE_NGRAMS = True  # Restored after the import.
+    factory(name="rue de l'avoine")
+    generation = DB.get("_index_generation")
+    path = tmp_path / "docs.ndjson"
+    docs = [{"_id": "a", "name": "rue du blé", "lat": 1, "lon": 1}]
+    docs.append({"_id": "b", "name": "rue de l'orge", "lat": 1, "lon": 1})
+    path.write_text("\n".join(json.dumps(doc) for doc in docs))
+    args = ReindexArgs()
+    args.filepath = [str(path)]
+    reindex(args)
+    assert DB.connection_pool.connection_kwargs["db"] == 14
+    assert ds._DB.connection_pool.connection_kwargs["db"] == 15
+    assert not search("avoine")
+    assert search("blé")[0]._id == "a"
+    assert search("bl", autocomplete=True)  # Edge ngrams.
+    assert index_generation() != generation
+    assert not redis.Redis(**staging_params("indexes")).dbsize()
+    assert not redis.Redis(**staging_params("documents")).dbsize()
+
+
+def test_reindex_does_not_swap_too_few_documents(factory, config, tmp_path):
+    from addok.batch import reindex, staging_params
+
+    config.INDEX_EDGE_NGRAMS = True
+    for name in ["avoine", "blé", "orge"]:
+        factory(name="rue de {}".format(name))
+    path = tmp_path / "docs.ndjson"
+    doc = {"_id": "a", "name": "rue du seigle", "lat": 1, "lon": 1}
+    path.write_text(json.dumps(doc))
+    args = ReindexArgs()
+    args.filepath = [str(path)]
+    reindex(args)
+    assert search("avoine")
+    assert not search("seigle")
+    redis.Redis(**staging_params("indexes")).flushdb()
+    redis.Redis(**staging_params("documents")).flushdb()
+
+
+def test_reindex_only_counts_documents(factory, config, tmp_path):
+    from addok.batch import reindex
+
+    config.INDEX_EDGE_NGRAMS = True  # Restored after the import.
+    config.DOCUMENT_PROJECTION_FIELDS = ["name", "lat", "lon"]
+    factory(name="rue de l'avoine")
+    factory(name="rue de l'orge")
+    config.DOCUMENT_PROJECTION_FIELDS = []
+    path = tmp_path / "docs.ndjson"
+    docs = [{"_id": "a", "name": "rue du blé", "lat": 1, "lon": 1}]
+    docs.append({"_id": "b", "name": "rue du seigle", "lat": 1, "lon": 1})
+    path.write_text("\n".join(json.dumps(doc) for doc in docs))
+    args = ReindexArgs()
+    args.filepath = [str(path)]
+    reindex(args)
+    assert not search("avoine")
+    assert search("blé")
+
+
+def test_reindex_without_edge_ngrams_indexer(factory, config, tmp_path):
+    from addok.autocomplete import EdgeNgramIndexer, edge_ngram_key
+    from addok.batch import reindex
+
+    config.INDEX_EDGE_NGRAMS = True  # Restored after the import.
+    config.INDEXERS = [i for i in config.INDEXERS if i is not EdgeNgramIndexer]
+    path = tmp_path / "docs.ndjson"
+    doc = {"_id": "a", "name": "rue de l'avoine", "lat": 1, "lon": 1}
+    path.write_text(json.dumps(doc))
+    args = ReindexArgs()
+    args.filepath = [str(path)]
+    reindex(args)
+    assert search("avoine")
+    assert not DB.keys(edge_ngram_key("*"))
+
+
+def test_reindex_does_not_delete_data_of_spare_databases(factory, config, tmp_path):
+    from addok.batch import reindex, staging_params
+
+    config.INDEX_EDGE_NGRAMS = True  # Restored after the import.
+    factory(name="rue de l'avoine")
+    staging = redis.Redis(**staging_params("documents"))
+    staging.set("other", "data")
+    path = tmp_path / "docs.ndjson"
+    path.write_text(json.dumps({"_id": "a", "name": "rue du blé", "lat": 1, "lon": 1}))
+    args = ReindexArgs()
+    args.filepath = [str(path)]
+    reindex(args)
+    assert staging.get("other") == b"data"
+    assert search("avoine")
+    args.force = True
+    reindex(args)
+    assert search("blé")
+    assert not staging.exists("other")
+
+
+def test_incremental_import_skips_unchanged_documents(config, monkeypatch):
+    from addok.ds import DS
+
+    config.INCREMENTAL_IMPORT = True
+    docs = [
+        {"_id": str(i), "name": "rue de l'avoine {}".format(i), "lat": 1, "lon": 1}
+        for i in range(3)
+    ]
+    process_documents(*(json.dumps(doc) for doc in docs))
+    assert len(search("rue de l'avoine", limit=10)) == 3
+    generation = DB.get("_index_generation")
+    calls = []
+    upsert = DS.upsert
+
+    def spy(*blobs):
+        calls.append([key for key, _ in blobs])
+        return upsert(*blobs)
+
+    monkeypatch.setitem(vars(DS), "upsert", spy)
+    process_documents(*(json.dumps(doc) for doc in docs))
+    assert calls == []
+    assert DB.get("_index_generation") == generation
+    docs[1]["name"] = "rue du blé"
+    process_documents(*(json.dumps(doc) for doc in docs))
+    assert calls == [["d|1"]]
+    assert search("blé")[0]._id == "1"
+    assert len(search("rue de l'avoine", limit=10)) == 2
+    process_documents(json.dumps({"_id": "1", "_action": "delete"}))
+    assert not search("blé")
+    process_documents(*(json.dumps(doc) for doc in docs))
+    assert calls[-1] == ["d|1"]  # Imported again.
+    assert search("blé")[0]._id == "1"
+
+
+def test_incremental_import_skips_documents_without_id(config, caplog):
+    config.INCREMENTAL_IMPORT = True
+    doc = {"name": "rue de l'avoine", "lat": 1, "lon": 1}
+    for _ in range(2):
+        process_documents(json.dumps(doc), json.dumps(dict(doc, _id="a")))
+    assert [r._id for r in search("rue de l'avoine", limit=10)] == ["a"]
+    assert "Skipped 1 documents without _id" in caplog.text
@@ -0,0 +1,162 @@
+import json
+
+import pytest
+
+from addok import ds
+from addok.batch import process_documents
+from addok.build import RESPWriter, build_documents
+from addok.core import search
+from addok.db import DB
+
+DOCS = [
+    {
+        "_id": "xxxx",
+        "type": "street",
+        "name": "rue des Lilas",
+        "city": "Andrésy",
+        "lat": "48.32545",
+        "lon": "2.2565",
+        "housenumbers": {"1": {"lat": "48.325451", "lon": "2.25651"}},
+    },
+    {
+        "_id": "yyyy",
+        "type": "city",
+        "name": "Andrésy",
+        "lat": "48.32",
+        "lon": "2.25",
+        "importance": 0.5,
+    },
+]
+
+
+def parse(content):
+    """Yield the commands of a Redis protocol stream."""
+    lines = iter(content.split(b"\r\n"))
+    for line in lines:
+        if not line:
+            continue
+        count = int(line[1:])
+        yield [next(lines) for _ in range(count * 2)][1::2]
+
+
+def load(path, db):
+    for command in parse(path.read_bytes()):
+        if command[0] != b"SELECT":
+            db.execute_command(*command)
+
+
+def dump(db):
+    out = {}
+    for key in db.keys():
+        type_ = db.type(key)
+        if type_ == b"zset":
+            out[key] = db.zrange(key, 0, -1, withscores=True)
+        elif type_ == b"set":
+            out[key] = db.smembers(key)
+        elif type_ == b"hash":
+            out[key] = db.hgetall(key)
+        else:
+            out[key] = db.get(key)
+    out.pop(b"_index_generation", None)
+    return out
+
+
+def test_resp_writer_merges_members():
+    writer = RESPWriter(db=3)
+    writer.sadd("s", "b", "a")
+    writer.sadd("s", "a")
+    writer.zadd("z", {"m": 1.5})
+    writer.set("k", "é")
+    assert list(parse(writer.getvalue())) == [
+        [b"SELECT", b"3"],
+        [b"SET", b"k", "é".encode()],
+        [b"SADD", b"s", b"a", b"b"],
+        [b"ZADD", b"z", b"1.5", b"m"],
+    ]
+
+
+@pytest.mark.parametrize("incremental", [False, True])
+def test_build_should_match_batch_import(tmp_path, config, incremental):
+    config.INCREMENTAL_IMPORT = incremental
+    rows = [json.dumps(doc) for doc in DOCS]
+    process_documents(*rows)
+    indexes, documents = dump(DB), dump(ds._DB)
+    DB.flushdb()
+    ds._DB.flushdb()
+    assert list(build_documents(tmp_path, *rows)) == rows
+    for path in tmp_path.glob("documents-*.resp"):
+        load(path, ds._DB)
+    for path in tmp_path.glob("indexes-*.resp"):
+        load(path, DB)
+    assert dump(DB) == indexes
+    assert dump(ds._DB) == documents
+    assert search("rue des lilas andresy")[0]._id == "xxxx"
+
+
+def test_build_should_be_reproducible(tmp_path):
+    rows = [json.dumps(doc) for doc in DOCS]
+    for name in ["a", "b"]:
+        (tmp_path / name).mkdir()
+        build_documents(tmp_path / name, *rows)
+    names = sorted(p.name for p in (tmp_path / "a").iterdir())
+    assert len(names) == 2
+    assert sorted(p.name for p in (tmp_path / "b").iterdir()) == names
+
+
+class BuildArgs:
+    def __init__(self, output, *filepath):
+        self.output = str(output)
+        self.filepath = [str(path) for path in filepath]
+
+
+@pytest.fixture
+def dict_serializer(config):
+    from addok.helpers.serializers import DictZlibSerializer
+
+    config.INDEX_EDGE_NGRAMS = True  # Restored after the build.
+    config.DOCUMENT_SERIALIZER = DictZlibSerializer
+    DictZlibSerializer.reset()
+    DictZlibSerializer.dictionaries.clear()
+    yield DictZlibSerializer
+    DictZlibSerializer.reset()
+
+
+def load_build(output):
+    for path in output.glob("documents-*.resp"):
+        load(path, ds._DB)
+    for path in sorted(output.glob("indexes-*.resp")) + [output / "generation.resp"]:
+        load(path, DB)
+
+
+def test_build_should_carry_its_serializer_dictionary(tmp_path, dict_serializer):
+    from addok.build import build
+
+    path = tmp_path / "docs.ndjson"
+    path.write_text("\n".join(json.dumps(doc) for doc in DOCS))
+    for name in ["a", "b"]:
+        DB.flushdb()  # Trained again from the same documents.
+        dict_serializer.reset()
+        build(BuildArgs(tmp_path / name, path))
+    names = sorted(p.name for p in (tmp_path / "a").iterdir())
+    assert sorted(p.name for p in (tmp_path / "b").iterdir()) == names
+    DB.flushdb()  # As on another host.
+    ds._DB.flushdb()
+    dict_serializer.reset()
+    dict_serializer.dictionaries.clear()
+    load_build(tmp_path / "a")
+    assert DB.hget("_serializer_dictionaries", "current")
+    assert search("rue des lilas andresy")[0]._id == "xxxx"
+
+
+def test_build_should_not_give_loaded_ids_again(tmp_path, config):
+    from addok.build import build
+
+    config.INDEX_EDGE_NGRAMS = True  # Restored after the build.
+    path = tmp_path / "docs.ndjson"
+    path.write_text(json.dumps({"name": "rue des Lilas", "lat": 1, "lon": 1}))
+    build(BuildArgs(tmp_path / "out", path))
+    DB.flushdb()  # As on another host.
+    ds._DB.flushdb()
+    load_build(tmp_path / "out")
+    _id = search("rue des lilas")[0]._id
+    assert DB.next_id() != _id
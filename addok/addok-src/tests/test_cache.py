@@ -0,0 +1,159 @@
+from addok import hooks
+from addok.core import SEARCH_CACHE, search
+from addok.db import DB
+from addok.helpers.cache import LRUCache, bump_generation, index_generation
+
+
+class Recorder:
+    __name__ = "recorder"
+
+    def __init__(self):
+        self.operations = []
+
+    def record_cache_operation(self, operation, result):
+        self.operations.append((operation, result))
+
+    def of(self, operation):
+        return [result for name, result in self.operations if name == operation]
+
+
+def test_bump_generation_changes_index_generation():
+    before = index_generation()
+    bump_generation()
+    assert index_generation() != before
+    assert DB.get("_index_generation") == index_generation()
+
+
+def test_lru_cache_is_bounded(config):
+    config.TEST_CACHE_SIZE = 2
+    cache = LRUCache("test", "TEST_CACHE_SIZE")
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert len(cache) == 2
+    assert cache.get("b") is None  # Least recently used.
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_lru_cache_is_cleared_on_new_generation(config):
+    config.TEST_CACHE_SIZE = 2
+    cache = LRUCache("test", "TEST_CACHE_SIZE")
+    cache.set("a", 1)
+    bump_generation()
+    assert cache.get("a") is None
+
+
+def test_search_results_are_cached(factory, config, monkeypatch):
+    config.SEARCH_CACHE_SIZE = 10
+    recorder = Recorder()
+    monkeypatch.setitem(hooks.plugins, "recorder", recorder)
+    factory(name="rue de la paix")
+    results = search("rue de la paix")
+    assert recorder.of("search") == ["miss"]
+    # Same normalized query.
+    assert search("Rue de la Paix")[0].id == results[0].id
+    assert recorder.of("search") == ["miss", "hit"]
+    assert len(SEARCH_CACHE) == 1
+
+
+def test_search_cache_is_invalidated_by_import(factory, config):
+    config.SEARCH_CACHE_SIZE = 10
+    factory(name="rue de la paix")
+    assert len(search("rue de la paix")) == 1
+    factory(name="rue de la paix", city="Paris")
+    assert len(search("rue de la paix")) == 2
+
+
+def test_search_cache_key_includes_filters_and_limit(factory, config):
+    config.SEARCH_CACHE_SIZE = 10
+    factory(name="rue de la paix", type="street")
+    factory(name="rue de la paix", type="city")
+    assert len(search("rue de la paix")) == 2
+    assert len(search("rue de la paix", type="city")) == 1
+    assert len(search("rue de la paix", limit=1)) == 1
+
+
+def test_search_cache_rounds_center(factory, config):
+    config.SEARCH_CACHE_SIZE = 10
+    factory(name="rue de la paix", lat=48.32541, lon=2.25601)
+    results = search("rue de la paix", lat=48.32541, lon=2.25601)
+    assert search("rue de la paix", lat=48.32539, lon=2.25599) == results
+
+
+def test_shared_search_cache(factory, config):
+    config.SEARCH_CACHE_TTL = 60
+    doc = factory(name="rue de la paix", city="Paris")
+    results = search("rue de la paix paris")
+    assert DB.keys("c|search_shared|*")
+    cached = search("rue de la paix paris")
+    assert cached[0] is not results[0]
+    assert cached[0].id == doc["id"]
+    assert str(cached[0]) == str(results[0]) == "rue de la paix Paris"
+    assert cached[0].score == results[0].score
+
+
+def test_token_frequencies_are_cached(factory, monkeypatch):
+    from addok.helpers.index import token_frequency
+
+    factory(name="rue des lilas")
+    assert token_frequency("lilas") == 1
+    recorder = Recorder()
+    monkeypatch.setitem(hooks.plugins, "recorder", recorder)
+    monkeypatch.setattr(DB, "pipeline", None, raising=False)  # No more Redis.
+    assert token_frequency("lilas") == 1
+    assert recorder.of("token_frequency") == ["hit"]
+
+
+def test_token_frequencies_cache_is_invalidated_by_import(factory):
+    from addok.helpers.index import token_frequency
+
+    factory(name="rue des lilas")
+    assert token_frequency("lilas") == 1
+    factory(name="rue des lilas")
+    assert token_frequency("lilas") == 2
+
+
+def test_geohash_unions_are_written_once(factory, monkeypatch):
+    from addok.core import compute_geohash_key
+
+    factory(name="rue des lilas", lat=48.1, lon=2.2)
+    key = compute_geohash_key("u099dh3")
+    assert key.startswith("gx|")
+    assert DB.ttl(key) > 10
+    monkeypatch.setattr(DB, "pipeline", None, raising=False)  # No more Redis.
+    assert compute_geohash_key("u099dh3") == key
+    assert compute_geohash_key("u099dh3") == key
+
+
+def test_empty_geohash_unions_are_remembered(factory, monkeypatch):
+    from addok.core import compute_geohash_key
+
+    factory(name="rue des lilas", lat=48.1, lon=2.2)
+    assert compute_geohash_key("s00000") is False
+    monkeypatch.setattr(DB, "pipeline", None, raising=False)
+    assert compute_geohash_key("s00000") is False
+
+
+def test_geohash_unions_are_invalidated_by_import(factory):
+    from addok.core import compute_geohash_key
+
+    factory(name="rue des lilas", lat=48.1, lon=2.2)
+    key = compute_geohash_key("u099dh3")
+    factory(name="rue des roses", lat=48.1, lon=2.2)
+    other = compute_geohash_key("u099dh3")
+    assert other != key
+    assert DB.scard(other) == 2
+
+
+def test_geohash_unions_can_have_a_lower_precision(factory, config):
+    from addok.core import compute_geohash_key, search_geohash
+
+    factory(name="rue des lilas", lat=48.1, lon=2.2)
+    factory(name="rue des lilas", lat=48.11, lon=2.22)
+    assert DB.scard(compute_geohash_key("u099dh3")) == 1
+    assert DB.scard(compute_geohash_key("u099d")) == 2
+    assert search_geohash(48.1, 2.2) == "u099dh3"
+    config.SEARCH_GEOHASH_PRECISION = 5
+    assert search_geohash(48.1, 2.2) == "u099d"
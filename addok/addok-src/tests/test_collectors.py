@@ -1,3 +1,7 @@
+import pytest
+
+from addok.core import search
+from addok.helpers import collectors
 from addok.helpers.collectors import _extract_manytomany_relations
 from addok.helpers.text import Token
 
@@ -65,3 +69,74 @@ def test_extract_manytomany_relations_3(factory, config):
     assert groups == [
         {Token("lattre"), Token("aignan"), Token("76130"), Token("mont")},
     ]
+
+
+def server_side_collectors():
+    from addok.config import config as addok_config
+
+    replaced = [
+        collectors.bucket_with_meaningful,
+        collectors.reduce_with_other_commons,
+        collectors.ensure_geohash_results_are_included_if_center_is_given,
+    ]
+    chain = []
+    for collector in addok_config.RESULTS_COLLECTORS:
+        if collector in replaced:
+            if collectors.bucket_on_server not in chain:
+                chain.append(collectors.bucket_on_server)
+        else:
+            chain.append(collector)
+    return chain
+
+
+@pytest.fixture
+def parity_data(factory, config):
+    config.BUCKET_MIN = 2
+    config.BUCKET_MAX = 6
+    config.COMMON_THRESHOLD = 10
+    cities = ["Paris", "Lyon", "Lille", "Nantes"]
+    names = ["rue des lilas", "rue de la paix", "avenue de la gare", "rue du port"]
+    for i, city in enumerate(cities):
+        for j, name in enumerate(names):
+            factory(
+                name=name,
+                city=city,
+                postcode="7500{}".format(i),
+                type="street" if j % 2 else "locality",
+                lat=48 + i / 10 + j / 1000,
+                lon=2 + i / 10,
+                importance=j / 10,
+            )
+        factory(name=city, type="city", lat=48 + i / 10, lon=2 + i / 10)
+
+
+@pytest.mark.parametrize(
+    "query,kwargs",
+    [
+        ("rue des lilas paris", {}),
+        ("rue des lilas", {}),
+        ("rue de la paix", {"autocomplete": True}),
+        ("rue de la pa", {"autocomplete": True}),
+        ("rue de", {"autocomplete": True}),
+        ("paris", {}),
+        ("rue paix lyon", {"limit": 2}),
+        ("rue de la paix", {"type": "street"}),
+        ("rue des lilas 75002", {"postcode": "75002"}),
+        ("rue du port", {"lat": 48.2, "lon": 2.2}),
+        ("rue de la", {"lat": 48.1, "lon": 2.1, "autocomplete": True}),
+        ("avenue gare nantes", {"autocomplete": True}),
+        ("rue des lilsa", {}),
+        ("de la", {}),
+        ("rue de la", {"lat": 48.3, "lon": 2.3}),
+        ("de la rue", {"lat": 48.3, "lon": 2.3, "autocomplete": True}),
+    ],
+)
+def test_bucket_on_server_parity(parity_data, config, query, kwargs):
+    def run():
+        # Order of results with same score is arbitrary.
+        return sorted((-r.score, r.id) for r in search(query, **kwargs))
+
+    expected = run()
+    assert expected
+    config.RESULTS_COLLECTORS = server_side_collectors()
+    assert run() == expected
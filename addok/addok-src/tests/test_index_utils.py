@@ -78,7 +78,7 @@ def test_index_document():
     assert b"d|yyyy" in DB.smembers("f|type|street")
     assert DB.exists("f|type|housenumber")
     assert b"d|yyyy" in DB.smembers("f|type|housenumber")
-    assert len(DB.keys()) == 17
+    assert len(DB.keys()) == 18  # Including index generation.
     assert len(ds._DB.keys()) == 1
 
 
@@ -110,7 +110,7 @@ def test_deindex_document_should_deindex():
     assert not DB.exists("n|andre")
     assert not DB.exists("n|andres")
     assert not DB.exists("f|type|street")
-    assert len(DB.keys()) == 0
+    assert DB.keys() == [b"_index_generation"]
     assert len(ds._DB.keys()) == 0
 
 
@@ -163,7 +163,7 @@ def test_deindex_document_should_not_affect_other_docs():
     assert b"d|yyyy2" in DB.smembers("f|type|street")
     assert DB.exists("f|type|housenumber")
     assert b"d|yyyy2" in DB.smembers("f|type|housenumber")
-    assert len(DB.keys()) == 16
+    assert len(DB.keys()) == 17  # Including index generation.
     assert len(ds._DB.keys()) == 1
 
 
@@ -197,7 +197,7 @@ def test_deindex_document_should_deindex_list_values():
     assert not ds._DB.exists("d|yyyy")
     assert not DB.exists("w|vernou")
     assert not DB.exists("w|celle")
-    assert len(DB.keys()) == 0
+    assert DB.keys() == [b"_index_generation"]
 
 
 def test_deindex_document_should_not_fail_if_id_do_not_exist():
@@ -321,7 +321,7 @@ def test_create_edge_ngrams(config):
     assert DB.exists("n|pa")
     assert DB.exists("n|par")
     assert not DB.exists("n|28")
-    assert len(DB.keys()) == 13
+    assert len(DB.keys()) == 14  # Including index generation.
     assert len(ds._DB.keys()) == 1
 
 
@@ -331,3 +331,90 @@ def test_index_document_with_custom_id(config):
     doc["custom"] = "custom_id"
     index_document(doc)
     assert ds._DB.exists("d|custom_id")
+
+
+def test_split_housenumbers_are_indexed_apart(config):
+    from addok.ds import get_document
+
+    config.SPLIT_HOUSENUMBERS = True
+    doc = json.loads(json.dumps(DOC))
+    doc["housenumbers"]["2 bis"] = {"lat": "48.325459", "lon": "2.25659"}
+    index_document(doc)
+    assert "housenumbers" not in get_document("d|yyyy")
+    assert json.loads(DB.hget("h|yyyy", "2bis")) == {
+        "lat": "48.325459",
+        "lon": "2.25659",
+        "raw": "2 bis",
+    }
+    assert b"d|yyyy" in DB.smembers("g|u09dgm7")
+    deindex_document(doc["_id"])
+    assert not DB.exists("h|yyyy")
+    assert not DB.exists("g|u09dgm7")
+
+
+@pytest.mark.parametrize("importance,position,lookups", [(1, 0, 1), (0, 60, 3)])
+def test_deindex_document_should_keep_pairs_shared_further_in_the_sets(
+    config, importance, position, lookups
+):
+    # Alpha is the smaller set, where the remaining common document comes
+    # first or last.
+    config.IMPORTANCE_WEIGHT = 10
+    for i in range(60):
+        index_document({"_id": "a{}".format(i), "name": "alpha", "lat": 1, "lon": 1})
+    for i in range(120):
+        index_document({"_id": "b{}".format(i), "name": "beta", "lat": 1, "lon": 1})
+    index_document(
+        {
+            "_id": "common",
+            "name": "alpha beta",
+            "importance": importance,
+            "lat": 1,
+            "lon": 1,
+        }
+    )
+    index_document({"_id": "gone", "name": "alpha beta gamma", "lat": 1, "lon": 1})
+    assert DB.zrevrange("w|alpha", 0, -1).index(b"d|common") == position
+    DB.config_resetstat()
+    deindex_document("gone")
+    if "cmdstat_zintercard" not in DB.info("commandstats"):
+        # Slices are looked up highest scores first.
+        assert DB.info("commandstats")["cmdstat_zmscore"]["calls"] == lookups
+    assert DB.smembers("p|alpha") == {b"beta"}
+    assert DB.smembers("p|beta") == {b"alpha"}
+    assert not DB.exists("p|gamma")
+    deindex_document("common")
+    assert not DB.exists("p|alpha")
+    assert not DB.exists("p|beta")
+
+
+@pytest.mark.parametrize("lookup", ["zintercard", "zmscore", "zscore"])
+def test_deindex_pairs_lookups(lookup):
+    from addok.helpers import scripts
+
+    version = DB.info("server")["redis_version"]
+    has_zintercard = tuple(int(i) for i in version.split(".")[:2]) >= (7, 0)
+    DB.zadd("w|alpha", {"d|1": 1, "d|2": 1})
+    DB.zadd("w|beta", {"d|1": 1})
+    DB.zadd("w|gamma", {"d|3": 1})
+    DB.sadd("p|alpha", "beta", "gamma")
+    DB.sadd("p|beta", "alpha", "gamma")
+    DB.sadd("p|gamma", "alpha", "beta")
+    tokens = ["alpha", "beta", "gamma"]
+    token_keys = ["w|{}".format(token) for token in tokens]
+    pair_keys = ["p|{}".format(token) for token in tokens]
+    DB.config_resetstat()
+    scripts.deindex_pairs(keys=token_keys + pair_keys, args=tokens + [lookup])
+    assert DB.smembers("p|alpha") == {b"beta"}
+    assert DB.smembers("p|beta") == {b"alpha"}
+    assert not DB.exists("p|gamma")
+    stats = DB.info("commandstats")
+    if lookup == "zintercard" and has_zintercard:
+        assert "cmdstat_zintercard" in stats
+    elif lookup == "zintercard":
+        # Unknown command error caught, then next lookup used.
+        assert "cmdstat_zmscore" in stats
+    else:
+        assert "cmdstat_{}".format(lookup) in stats
+        assert "cmdstat_zintercard" not in stats
+    if lookup == "zscore":
+        assert "cmdstat_zmscore" not in stats
@@ -0,0 +1,80 @@
+import pytest
+
+from addok.core import search
+from addok.ds import DS
+from addok.mmapstore import MMapStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return MMapStore(str(tmp_path / "documents"))
+
+
+@pytest.fixture
+def mmapstore(store, monkeypatch):
+    monkeypatch.setattr(DS, "instance", store)
+    return store
+
+
+def test_fetch_before_any_write(store):
+    assert list(store.fetch("d|1")) == []
+
+
+def test_fetch_appended_documents(store):
+    store.upsert(("d|1", b"one"), ("d|2", b"two"))
+    assert list(store.fetch("d|1", b"d|2", "d|3")) == [
+        ("d|1", b"one"),
+        (b"d|2", b"two"),
+    ]
+
+
+def test_upsert_and_remove_after_compaction(store):
+    store.upsert(("d|1", b"one"), ("d|2", b"two"), ("d|3", b"three"))
+    store.upsert(("d|2", b"deux"))
+    store.remove("d|3")
+    assert store.compact() == 2
+    assert dict(store.fetch("d|1", "d|2", "d|3")) == {
+        "d|1": b"one",
+        "d|2": b"deux",
+    }
+    assert len(store.hashes) == 2
+    assert store.overlay == {}
+    store.upsert(("d|3", b"trois"))
+    store.remove("d|1")
+    assert dict(store.fetch("d|1", "d|2", "d|3")) == {
+        "d|2": b"deux",
+        "d|3": b"trois",
+    }
+
+
+def test_readers_see_compacted_files(store):
+    store.upsert(("d|1", b"one"))
+    reader = MMapStore(store.path)
+    assert list(reader.fetch("d|1")) == [("d|1", b"one")]
+    store.upsert(("d|1", b"un"))
+    store.compact()
+    assert list(reader.fetch("d|1")) == [("d|1", b"un")]
+    assert reader.overlay == {}
+
+
+def test_flushdb(store):
+    store.upsert(("d|1", b"one"))
+    store.compact()
+    store.flushdb()
+    assert list(store.fetch("d|1")) == []
+
+
+def test_search_with_mmapstore(mmapstore, factory):
+    factory(name="rue des lilas")
+    mmapstore.compact()
+    factory(name="rue des roses")
+    assert sorted(r.name for r in search("rue")) == ["rue des lilas", "rue des roses"]
+    assert len(mmapstore.hashes) == 1
+
+
+def test_scan(store):
+    store.upsert(("d|1", b"one"), ("d|2", b"two"))
+    store.compact()
+    store.upsert(("d|2", b"deux"), ("d|3", b"trois"))
+    store.remove("d|1")
+    assert sorted(store.scan()) == [(b"d|2", b"deux"), (b"d|3", b"trois")]
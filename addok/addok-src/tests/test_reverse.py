@@ -1,3 +1,7 @@
+import asyncio
+
+import pytest
+
 from addok.core import reverse
 
 
@@ -55,3 +59,134 @@ def test_reverse_should_enforce_housenumber_if_filtered(factory):
     )
     results = reverse(lat=48.234544, lon=5.235444, type="housenumber")
     assert results[0].type == "housenumber"
+
+
+def test_reverse_fetches_documents_at_once(factory, monkeypatch):
+    from addok.ds import DS
+
+    for i in range(5):
+        factory(lat=48.234545 + i / 100000, lon=5.235445)
+    calls = []
+    fetch = DS.fetch
+
+    def spy(*keys):
+        calls.append(keys)
+        return fetch(*keys)
+
+    monkeypatch.setitem(vars(DS), "fetch", spy)
+    results = reverse(lat=48.234545, lon=5.235445, limit=3)
+    assert len(results) == 3
+    assert results[0].lat == 48.234545
+    assert len(calls) == 1
+    assert len(calls[0]) == 5
+
+
+def test_reverse_expands_rings_until_something_is_found(factory):
+    # About 550m north, so 4 geohash cells away.
+    far = factory(lat=48.239545, lon=5.235445)
+    results = reverse(lat=48.234545, lon=5.235445)
+    assert results[0].id == far["id"]
+
+
+def test_reverse_expands_rings_until_limit_closest_are_known(factory):
+    close = factory(lat=48.234546, lon=5.235446)
+    far = factory(lat=48.237545, lon=5.235445)
+    results = reverse(lat=48.234545, lon=5.235445, limit=2)
+    assert [r.id for r in results] == [close["id"], far["id"]]
+
+
+def test_reverse_stops_expanding_when_closest_is_known(factory, monkeypatch):
+    from addok.core import Reverse
+
+    factory(lat=48.234546, lon=5.235446)
+    far = factory(lat=48.237545, lon=5.235445)
+    fetched = []
+    fetch = Reverse.fetch
+
+    def spy(self, hashes):
+        fetched.append(hashes)
+        return fetch(self, hashes)
+
+    monkeypatch.setattr(Reverse, "fetch", spy)
+    results = reverse(lat=48.234545, lon=5.235445)
+    assert len(results) == 1
+    assert results[0].id != far["id"]
+    assert len(fetched) == 1
+    assert len(fetched[0]) == 9
+
+
+@pytest.fixture
+def geo(config):
+    from addok.geo import GeoIndexer, GeoReverse
+
+    config.INDEXERS = config.INDEXERS + [GeoIndexer]
+    config.REVERSE_HELPER = GeoReverse
+
+
+def test_geo_reverse_return_closer_point(geo, factory):
+    factory(lat=78.23, lon=-15.23)
+    factory(lat=48.237545, lon=5.235445)
+    good = factory(lat=48.234546, lon=5.235446)
+    results = reverse(lat=48.234545, lon=5.235445)
+    assert [r.id for r in results] == [good["id"]]
+
+
+def test_geo_reverse_return_housenumber(geo, factory):
+    factory(
+        lat=48.234544,
+        lon=5.235444,
+        housenumbers={"24": {"lat": 48.234545, "lon": 5.235445}},
+    )
+    results = reverse(lat=48.234545, lon=5.235445)
+    assert results[0].housenumber == "24"
+    assert results[0].type == "housenumber"
+    results = reverse(lat=48.234545, lon=5.235445, type="street")
+    assert results[0].type == "street"
+
+
+def test_geo_reverse_can_be_limited_and_filtered(geo, factory):
+    street = factory(lat=48.234545, lon=5.235445, type="street")
+    city = factory(lat=48.234546, lon=5.235446, type="city")
+    far = factory(lat=48.2445, lon=5.235446, type="city")
+    results = reverse(lat=48.234545, lon=5.235445, limit=2)
+    assert [r.id for r in results] == [street["id"], city["id"]]
+    results = reverse(lat=48.234545, lon=5.235445, limit=2, type="city")
+    assert [r.id for r in results] == [city["id"], far["id"]]
+
+
+def test_geo_reverse_expands_radius_until_something_is_found(geo, factory):
+    # About 11km north.
+    far = factory(lat=48.334545, lon=5.235445)
+    results = reverse(lat=48.234545, lon=5.235445)
+    assert results[0].id == far["id"]
+
+
+def test_geo_reverse_forgets_deleted_documents(geo, factory):
+    from addok.db import DB
+    from addok.helpers import keys
+
+    doc = factory(
+        lat=48.234545, lon=5.235445, housenumbers={"1": {"lat": 48.1, "lon": 5.2}}
+    )
+    assert DB.zcard(keys.GEO_KEY) == 2
+    doc.update(_action="delete")
+    assert DB.zcard(keys.GEO_KEY) == 0
+
+
+def test_reverse_with_split_housenumbers(factory, config):
+    from addok import aio
+
+    config.SPLIT_HOUSENUMBERS = True
+    factory(
+        lat=48.234544,
+        lon=5.235444,
+        housenumbers={"24": {"lat": 48.234545, "lon": 5.235445}},
+    )
+    for results in [
+        reverse(lat=48.234545, lon=5.235445),
+        asyncio.run(aio.reverse(lat=48.234545, lon=5.235445)),
+    ]:
+        assert results[0].housenumber == "24"
+        assert results[0].type == "housenumber"
+    results = reverse(lat=48.234545, lon=5.235445, type="street")
+    assert results[0].type == "street"
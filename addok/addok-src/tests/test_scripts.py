@@ -1,3 +1,4 @@
+from addok.db import DB
 from addok.helpers import scripts
 
 
@@ -67,3 +68,32 @@ def test_order_by_max_score(factory):
     factory(name="Vitry", importance=0.5)
     keys = ["w|monnaie", "w|lilas", "w|vitry", "w|rue"]
     assert scripts.order_by_max_score(keys=keys)[0] == b"w|vitry"
+
+
+def test_order_by_frequency_uses_tokens_stats(factory):
+    factory(name="rue des lilas", city="Vitry")
+    factory(name="rue des lilas", city="Pantin")
+    keys = ["w|lilas", "w|vitry", "w|pantin"]
+    assert scripts.order_by_frequency(keys=keys, args=["_tokens_stats"])[0] == (
+        b"w|lilas"
+    )
+    # Stats take precedence, missing ones are computed live.
+    DB.hset("_tokens_stats", mapping={"w|pantin": "10|1.0"})
+    assert scripts.order_by_frequency(keys=keys, args=["_tokens_stats"]) == [
+        b"w|pantin",
+        b"w|lilas",
+        b"w|vitry",
+    ]
+
+
+def test_order_by_max_score_uses_tokens_stats(factory):
+    factory(name="rue des lilas", city="Vitry")
+    factory(name="Vitry", importance=0.5)
+    keys = ["w|lilas", "w|vitry"]
+    assert scripts.order_by_max_score(keys=keys, args=["_tokens_stats"])[0] == (
+        b"w|vitry"
+    )
+    DB.hset("_tokens_stats", mapping={"w|lilas": "1|10.0"})
+    assert scripts.order_by_max_score(keys=keys, args=["_tokens_stats"])[0] == (
+        b"w|lilas"
+    )
@@ -1,4 +1,8 @@
-from addok.core import Result, search
+import json
+
+import pytest
+
+from addok.core import Result, search, search_many
 from addok.helpers import collectors
 
 
@@ -389,6 +393,41 @@ def test_allow_to_set_result_values(factory):
     assert result.score == 22
 
 
+def test_result_keeps_computed_values_in_slots(factory):
+    factory(name="porte des lilas", city="Paris", importance=0.3)
+    result = search("porte des lilas", lat=48.3, lon=2.25)[0]
+    assert result.distance
+    assert result.__dict__ == {}
+    result.extra = "blah"
+    assert result.extra == "blah"
+    properties = result.format()["properties"]
+    assert properties["city"] == "Paris"
+    assert properties["distance"] == int(result.distance)
+
+
+def test_geojson_fragment_should_match_geojson(factory, config):
+    from addok.helpers.formatters import FRAGMENTS, dumps, geojson, geojson_fragment
+
+    factory(name="porte des lilas", city="Paris", type="street", importance=0.3)
+    factory(name="rue des lilas", housenumbers={"11": {"lat": "48.32", "lon": "2.25"}})
+    queries = [
+        ("porte des lilas", {}),
+        ("porte des lilas", {"lat": 48.3, "lon": 2.25}),
+        ("11 rue des lilas", {}),
+    ]
+    for query, params in queries * 2:  # Second time from the cache.
+        for result in search(query, **params):
+            expected = json.dumps(geojson(result))
+            assert geojson_fragment(result) == expected
+    assert len(FRAGMENTS) == 1  # Housenumber result is not cached.
+    config.RESULTS_FORMATTERS = [geojson_fragment]
+    results = search("lilas", lat=48.3, lon=2.25)
+    content = {"type": "FeatureCollection", "features": [], "query": "a"}
+    expected = dict(content, features=[geojson(r) for r in results])
+    content["features"] = [r.format() for r in results]
+    assert json.loads(dumps(content)) == expected
+
+
 def test_should_keep_unchanged_name_as_default_label(factory):
     factory(name="Porte des Lilas")
     results = search("porte des lilas")
@@ -490,3 +529,194 @@ def test_extend_results_reducing_tokens_should_remove_two_tokens(factory, config
     # the search string, but it's not in the searched document.
     results = search("quai jules verne saint cyprie plage")
     assert results[0].name == "quai jules verne"
+
+
+def test_search_tokens_resolves_tokens_in_one_round_trip(factory, monkeypatch):
+    from addok.db import DB
+    from addok.helpers.search import search_tokens, tokenize
+
+    factory(name="rue des lilas")
+
+    class Helper:
+        query = "rue des lilas paris"
+
+    def fail(*args, **kwargs):
+        raise AssertionError("Tokens should be resolved through a pipeline.")
+
+    helper = Helper()
+    tokenize(helper)
+    monkeypatch.setattr(DB, "exists", fail, raising=False)
+    monkeypatch.setattr(DB, "zcard", fail, raising=False)
+    search_tokens(helper)
+    tokens = {str(t): t for t in helper.tokens}
+    assert tokens["lilas"].db_key == "w|lilas"
+    assert tokens["lilas"].frequency == 1
+    assert tokens["paris"].db_key is None
+    assert tokens["paris"].frequency == 0
+
+
+def test_search_many_returns_same_results_as_search(factory):
+    factory(name="rue des lilas", city="Paris", postcode="75020", type="street")
+    factory(name="rue des lilas", city="Lyon", postcode="69000", type="street")
+    factory(name="Paris", type="city", lat=48.85, lon=2.35)
+    factory(name="rue de paris", city="Lyon", housenumbers={"12": {"lat": 1, "lon": 2}})
+    queries = [
+        "rue des lilas paris",
+        {"q": "rue des lilas", "postcode": "69000"},
+        {"q": "paris", "lat": 48.8, "lon": 2.3},
+        "12 rue de paris",
+        "rue des lilas paris",
+        "nowhere",
+    ]
+    expected = []
+    for query in queries:
+        params = dict(query) if isinstance(query, dict) else {"q": query}
+        expected.append(
+            [(r.id, r.score, str(r)) for r in search(params.pop("q"), **params)]
+        )
+    results = search_many(queries)
+    assert [[(r.id, r.score, str(r)) for r in rs] for rs in results] == expected
+    assert results[-1] == []
+
+
+def test_search_many_shares_redis_work(factory, monkeypatch):
+    from addok.ds import DS
+
+    factory(name="rue des lilas", city="Paris")
+    factory(name="rue des lilas", city="Lyon")
+    calls = []
+    fetch = DS.fetch
+
+    def spy(*keys):
+        calls.append(keys)
+        return fetch(*keys)
+
+    monkeypatch.setitem(vars(DS), "fetch", spy)
+    queries = ["rue des lilas paris", "rue des lilas lyon", "rue des lilas lyon"]
+    # Checking the cream needs documents while collecting.
+    results = search_many(queries, limit=1, fuzzy=0, autocomplete=True)
+    assert [r[0].city for r in results] == ["Paris", "Lyon", "Lyon"]
+    assert len(calls) == 1
+    assert len(calls[0]) == 2
+    calls.clear()
+    results = search_many(queries, limit=1)
+    assert [r[0].city for r in results] == ["Paris", "Lyon", "Lyon"]
+    assert sorted(key for keys in calls for key in keys) == [b"d|jR", b"d|k5"]
+
+
+def test_search_many_applies_common_filters(factory):
+    factory(name="rue des lilas", type="street")
+    factory(name="rue des lilas", type="city")
+    results = search_many(["rue des lilas", {"q": "lilas"}], type="city")
+    assert [len(r) for r in results] == [1, 1]
+    assert results[0][0].type == "city"
+
+
+@pytest.mark.parametrize(
+    "query,params",
+    [
+        ("rue des lilas", {}),
+        ("rue des lilas", {"limit": 1}),
+        ("lilas", {"autocomplete": True, "limit": 3}),
+        ("rue des lils paris", {"limit": 2}),
+        ("rue des lilas", {"lat": 48.32, "lon": 2.25, "limit": 2}),
+    ],
+)
+def test_lazy_scoring_returns_same_results(factory, config, query, params):
+    for city in ["Paris", "Lyon", "Lille", "Nantes", "Nancy", "Brest", "Pau"]:
+        factory(name="rue des lilas", city=city, importance=len(city) / 10)
+        factory(name="allée des lilas", city=city, lat=48.3 + len(city) / 100)
+    factory(name="rue des lilas", city="Paris", importance=0.1)
+    expected = [(r.id, r.score, str(r)) for r in search(query, **params)]
+    assert expected
+    config.SEARCH_LAZY_SCORING = True
+    results = search(query, **params)
+    assert [(r.id, r.score, str(r)) for r in results] == expected
+
+
+def test_lazy_scoring_skips_costly_processors(factory, config):
+    from addok.helpers import results
+
+    # More than BUCKET_MIN results, so none is scored while collecting.
+    for importance in range(20):
+        factory(name="rue des lilas", importance=importance / 20)
+    calls = []
+
+    @results.bounded("str_distance")
+    def spy(helper, result):
+        calls.append(result)
+        results.score_by_ngram_distance(helper, result)
+
+    processors = [
+        spy if p is results.score_by_ngram_distance else p
+        for p in config.SEARCH_RESULT_PROCESSORS
+    ]
+    config.SEARCH_RESULT_PROCESSORS = processors
+    config.SEARCH_LAZY_SCORING = True
+    assert search("rue des lilas", limit=2)[0].importance == 0.95
+    assert len(calls) == 2
+
+
+def test_split_housenumbers_only_queried_one_is_loaded(factory, config, monkeypatch):
+    from addok.helpers import index
+
+    config.SPLIT_HOUSENUMBERS = True
+    factory(
+        name="rue des lilas",
+        housenumbers={
+            "11": {"lat": "48.32", "lon": "2.25"},
+            "12": {"lat": "48.33", "lon": "2.26"},
+        },
+    )
+    factory(name="rue des lilas", city="Lyon")
+    loads = []
+    load = index.load_housenumbers
+
+    def spy(docs, token=None):
+        docs = list(docs)
+        loads.append((len(docs), token))
+        load(docs, token)
+
+    monkeypatch.setattr("addok.core.load_housenumbers", spy)
+    results = search("11 rue des lilas")
+    assert loads == [(2, "11")]
+    assert results[0].housenumber == "11"
+    assert results[0].lat == "48.32"
+    assert "12" not in results[0]._doc["housenumbers"]
+    results = search("rue des lilas")
+    assert len(loads) == 1
+    assert results[0].housenumber is None
+
+
+def test_search_scores_projections_then_fetches_top_documents(
+    factory, config, monkeypatch
+):
+    from addok.ds import DS
+
+    config.DOCUMENT_PROJECTION_FIELDS = ["name", "type", "city", "lat", "lon"]
+    factory(
+        name="rue des lilas",
+        city="Paris",
+        extra="full",
+        housenumbers={"11": {"lat": "48.32", "lon": "2.25"}},
+    )
+    for i in range(5):
+        factory(name="rue des lilas", city="Lyon{}".format(i), extra="full")
+    config.DOCUMENT_PROJECTION_FIELDS = []
+    expected = [(r.id, r.score) for r in search("11 rue des lilas", limit=2)]
+    config.DOCUMENT_PROJECTION_FIELDS = ["name", "type", "city", "lat", "lon"]
+    fetched = []
+    fetch = DS.fetch
+
+    def spy(*keys):
+        fetched.append(sorted({k[:2] for k in keys}))
+        return fetch(*keys)
+
+    monkeypatch.setitem(vars(DS), "fetch", spy)
+    results = search("11 rue des lilas", limit=2)
+    assert fetched == [["s|"], ["d|"]]
+    assert [(r.id, r.score) for r in results] == expected
+    assert results[0].housenumber == "11"
+    assert results[0].lat == "48.32"
+    assert results[0].extra == "full"
+    assert results[1].extra == "full"
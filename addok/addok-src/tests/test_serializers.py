@@ -0,0 +1,79 @@
+import pytest
+
+from addok.db import DB
+from addok.helpers import keys
+from addok.helpers.serializers import (
+    DictZlibSerializer,
+    ZlibSerializer,
+    train_dictionary,
+)
+
+
+@pytest.fixture
+def serializer(config):
+    config.SERIALIZER_DICTIONARY_SAMPLE = 3
+    config.DOCUMENT_SERIALIZER = DictZlibSerializer
+    DictZlibSerializer.reset()
+    yield DictZlibSerializer
+    DictZlibSerializer.reset()
+
+
+def doc(i):
+    return {
+        "id": str(i),
+        "type": "housenumber",
+        "name": "rue des lilas",
+        "city": "Paris",
+        "postcode": "75011",
+        "lat": 48.1 + i / 1000,
+        "lon": 2.2,
+    }
+
+
+def test_train_dictionary_keeps_most_valuable_fragments_last():
+    samples = [DictZlibSerializer.encode(doc(i)) for i in range(3)]
+    dictionary = train_dictionary(samples, 1000)
+    assert dictionary.endswith(b'"rue des lilas",')
+    assert b'"id":' in dictionary
+    assert b'"0",' not in dictionary  # Not repeated.
+    assert len(train_dictionary(samples, 20)) <= 20
+
+
+def test_dictionary_is_trained_from_first_documents(serializer):
+    blobs = [serializer.dumps(doc(i)) for i in range(5)]
+    assert serializer.current
+    stored = DB.hget(keys.SERIALIZER_DICTIONARIES_KEY, serializer.current)
+    assert stored == serializer.dictionaries[serializer.current]
+    assert [serializer.loads(blob) for blob in blobs] == [doc(i) for i in range(5)]
+    assert len(blobs[4]) < len(blobs[0]) < len(ZlibSerializer.dumps(doc(0)))
+
+
+def test_dictionary_is_shared_by_processes(serializer):
+    for i in range(3):
+        serializer.dumps(doc(i))
+    current = serializer.current
+    serializer.reset()
+    serializer.dictionaries.clear()  # As in another process.
+    blob = serializer.dumps(doc(4))
+    assert serializer.current == current
+    assert serializer.loads(blob) == doc(4)
+
+
+def test_zlib_blobs_can_be_read(serializer):
+    assert serializer.loads(ZlibSerializer.dumps(doc(1))) == doc(1)
+
+
+def test_reencode(serializer, factory):
+    from addok.batch import reencode
+    from addok.ds import DS, get_document
+
+    serializer.current = 0  # Do not train on import.
+    key = keys.document_key(factory(**doc(0))["_id"])
+    for i in range(1, 5):
+        factory(**doc(i))
+    blob = list(DS.fetch(key))[0][1]
+    reencode()
+    assert serializer.current
+    new = list(DS.fetch(key))[0][1]
+    assert len(new) < len(blob)
+    assert get_document(key)["name"] == "rue des lilas"
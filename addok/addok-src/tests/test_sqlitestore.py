@@ -0,0 +1,68 @@
+import os
+
+import pytest
+
+from addok import hooks
+from addok.core import search
+from addok.ds import DS, SQLiteStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SQLiteStore(str(tmp_path / "addok.db"))
+
+
+def test_fetch_before_any_write(store):
+    assert list(store.fetch("d|1")) == []
+
+
+def test_upsert_fetch_and_remove(store):
+    store.upsert(("d|1", b"one"), ("d|2", b"two"))
+    assert list(store.fetch(b"d|2", "d|1", "d|3")) == [
+        (b"d|2", b"two"),
+        ("d|1", b"one"),
+    ]
+    store.upsert(("d|2", b"deux"))
+    store.remove("d|1")
+    assert dict(store.fetch("d|1", "d|2")) == {"d|2": b"deux"}
+    store.flushdb()
+    assert list(store.fetch("d|2")) == []
+
+
+def test_fetch_by_chunks(store):
+    docs = [("d|{}".format(i), str(i).encode()) for i in range(1100)]
+    store.upsert(*docs)
+    assert list(store.fetch(*(key for key, _ in docs))) == docs
+
+
+def test_connections_are_reopened_after_fork(store, monkeypatch):
+    store.upsert(("d|1", b"one"))
+    reader = store.reader
+    monkeypatch.setattr(os, "getpid", lambda: -1)
+    assert store.reader is not reader
+    assert list(store.fetch("d|1")) == [("d|1", b"one")]
+
+
+def test_operations_are_recorded(store, monkeypatch):
+    class Recorder:
+        operations = []
+
+        def record_sqlite_operation(self, operation_type):
+            self.operations.append(operation_type)
+
+    monkeypatch.setitem(hooks.plugins, "recorder", Recorder())
+    store.upsert(("d|1", b"one"))
+    list(store.fetch("d|1"))
+    store.remove("d|1")
+    assert Recorder.operations == ["upsert", "fetch", "remove"]
+
+
+def test_search_with_sqlitestore(store, monkeypatch, factory):
+    monkeypatch.setattr(DS, "instance", store)
+    factory(name="rue des lilas")
+    assert [r.name for r in search("lilas")] == ["rue des lilas"]
+
+
+def test_scan(store):
+    store.upsert(("d|1", b"one"), ("d|2", b"two"))
+    assert sorted(store.scan()) == [("d|1", b"one"), ("d|2", b"two")]
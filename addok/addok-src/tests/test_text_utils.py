@@ -6,6 +6,7 @@ from addok.helpers.text import (
     _tokenize,
     alphanumerize,
     ascii,
+    compare_ngrams,
     compare_str,
     compute_edge_ngrams,
     contains,
@@ -364,6 +365,25 @@ def test_compare_str(left, right, score):
     assert compare_str(left, right) == score
 
 
+@pytest.mark.parametrize(
+    "left,right,score",
+    [
+        # Same values as ngram.NGram.compare(left, right, N=2, pad_len=0).
+        ["rue des lilas", "Rue des Lilas", 1.0],
+        ["rue des lilas", "lilas", 0.3333333333333333],
+        ["baba", "abab", 0.5],
+        ["aaa", "aa", 0.5],
+        ["lilas", "lils", 0.4],
+        ["boulevard du port", "bd du port", 0.47058823529411764],
+        ["a", "ab", 0.0],
+        ["paris", "lyon", 0.0],
+        ["Y", "y", 1.0],
+    ],
+)
+def test_compare_ngrams(left, right, score):
+    assert compare_ngrams(left, right) == score
+
+
 @pytest.mark.parametrize(
     "best,other,query",
     [
@@ -18,12 +18,17 @@ from addok.http.base import CorsMiddleware, register_http_endpoint
 # Import monitoring components
 from monitoring.telemetry import initialize_telemetry
 from monitoring.falcon_middleware import create_telemetry_middleware, add_metrics_routes
+from monitoring import metrics_endpoint
 
 logger = logging.getLogger(__name__)
 
 def create_application():
     """Create Falcon application with OpenTelemetry integration"""
     try:
+        # Feed the Prometheus cache counters from Addok cache lookups
+        # (metrics_endpoint.record_cache_operation implements the hook)
+        hooks.register(metrics_endpoint)
+
         # Load Addok configuration
         config.load()
         